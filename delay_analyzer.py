@@ -1,22 +1,31 @@
+import logging
+from functools import lru_cache
+
+import numpy as np
 import pandas as pd
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from pydantic import BaseModel, ConfigDict
+# Pydantic needs typing_extensions.TypedDict on Python < 3.12
+from typing_extensions import TypedDict
 
+from config import USE_CUDF, CUDF_MIN_ROWS
 
-class DelayData(BaseModel):
-    """Model for individual status delay data"""
-    model_config = ConfigDict(
-        # Ensure None/null values are included in JSON output
-        use_enum_values=True,
-        validate_assignment=True
-    )
-    
+logger = logging.getLogger(__name__)
+
+
+class DelayData(TypedDict):
+    """
+    Individual status delay data.
+    A TypedDict rather than a model: analyze_delays already builds these
+    rows as plain dicts, so the response stays a dict with no per-row
+    model instances.
+    """
     status: str
-    delay_by_1_day: Optional[int] = None
-    delay_by_2_days: Optional[int] = None
-    delay_by_3_days: Optional[int] = None
-    delay_by_4_days: Optional[int] = None
-    delay_by_5_plus_days: Optional[int] = None
+    delay_by_1_day: Optional[int]
+    delay_by_2_days: Optional[int]
+    delay_by_3_days: Optional[int]
+    delay_by_4_days: Optional[int]
+    delay_by_5_plus_days: Optional[int]
     grand_total: int
 
 
@@ -72,20 +81,14 @@ PREDEFINED_LSP_COMPANIES = [
 ]
 
 
-class LSPDelayData(BaseModel):
-    """Model for individual LSP company delay data"""
-    model_config = ConfigDict(
-        # Ensure None/null values are included in JSON output
-        use_enum_values=True,
-        validate_assignment=True
-    )
-    
+class LSPDelayData(TypedDict):
+    """Individual LSP company delay data (plain dict, see DelayData)"""
     lsp_name: str
-    delay_by_1_day: Optional[int] = None
-    delay_by_2_days: Optional[int] = None
-    delay_by_3_days: Optional[int] = None
-    delay_by_4_days: Optional[int] = None
-    delay_by_5_plus_days: Optional[int] = None
+    delay_by_1_day: Optional[int]
+    delay_by_2_days: Optional[int]
+    delay_by_3_days: Optional[int]
+    delay_by_4_days: Optional[int]
+    delay_by_5_plus_days: Optional[int]
     grand_total: int
 
 
@@ -126,115 +129,276 @@ def categorize_delay(delay_value):
     Returns:
         str: Delay category bucket name or None if not delayed
     """
-    if pd.isna(delay_value):
+    if delay_value is None or delay_value is pd.NA:
         return None
     
-    # Try to parse as numeric value
-    try:
+    if isinstance(delay_value, (int, float, np.integer, np.floating)):
         delay_num = float(delay_value)
-        if delay_num <= 0:
+    else:
+        # Only non-numeric values can fail to parse, so only they pay for the try
+        try:
+            delay_num = float(delay_value)
+        except (ValueError, TypeError):
             return None
-        elif delay_num == 1:
-            return "delay_by_1_day"
-        elif delay_num == 2:
-            return "delay_by_2_days"
-        elif delay_num == 3:
-            return "delay_by_3_days"
-        elif delay_num == 4:
-            return "delay_by_4_days"
-        else:  # >= 5
-            return "delay_by_5_plus_days"
-    except (ValueError, TypeError):
+    
+    if not delay_num > 0:  # NaN, on-time or early
         return None
+    elif delay_num == 1:
+        return "delay_by_1_day"
+    elif delay_num == 2:
+        return "delay_by_2_days"
+    elif delay_num == 3:
+        return "delay_by_3_days"
+    elif delay_num == 4:
+        return "delay_by_4_days"
+    else:  # >= 5
+        return "delay_by_5_plus_days"
+
+
+# Delay category buckets, in column order
+DELAY_CATEGORIES = [
+    "delay_by_1_day",
+    "delay_by_2_days",
+    "delay_by_3_days",
+    "delay_by_4_days",
+    "delay_by_5_plus_days"
+]
 
 
-def clean_delay_column(df: pd.DataFrame, delay_col: str) -> pd.DataFrame:
+def _bucket_codes(values: np.ndarray) -> np.ndarray:
+    """
+    Map numeric delays to int8 indexes into DELAY_CATEGORIES.
+    
+    Args:
+        values: Float array of delays (NaN for unparseable cells)
+        
+    Returns:
+        np.ndarray: int8 bucket code per row, -1 where not delayed
+    """
+    codes = np.full(values.shape, 4, dtype=np.int8)  # >= 5
+    for code in range(4):
+        codes[values == code + 1] = code
+    # NaN compares False, so it lands here along with zero/negative delays
+    codes[~(values > 0)] = -1
+    return codes
+
+
+def clean_delay_column(df: pd.DataFrame, delay_col: str) -> pd.Series:
     """
     Clean and convert delay column to numeric values.
+    The input DataFrame is left untouched.
     
     Args:
         df: Pandas DataFrame containing the shipment data
         delay_col: Name of the delay column
         
     Returns:
-        pd.DataFrame: DataFrame with cleaned delay column
+        pd.Series: float32 delay values (NaN where the cell could not be parsed)
     """
-    # Convert to numeric, coercing errors to NaN
-    df[delay_col] = pd.to_numeric(df[delay_col], errors='coerce')
-    return df
+    # Convert to numeric, coercing errors to NaN. Delays are small day counts,
+    # so float32 is exact and halves the bytes scanned by the bucketing below
+    return pd.to_numeric(df[delay_col], errors='coerce').astype('float32')
 
 
-def find_required_columns(df: pd.DataFrame) -> tuple:
+class MissingColumnsError(ValueError):
+    """Raised when a file lacks the columns an analysis needs."""
+    
+    def __init__(self, found: List, need: str):
+        """
+        Args:
+            found: Column labels present in the file
+            need: Description of the columns the analysis requires
+        """
+        self.need = need
+        super().__init__(f"Required columns not found. Found columns: {found}. {need}")
+
+
+def _column_roles(col) -> Tuple[bool, bool, bool]:
     """
-    Find the delay and status columns in the dataframe.
+    Single source of the header matching rules shared by the resolver and the usecols filter.
     
     Args:
-        df: Pandas DataFrame containing the shipment data
+        col: Column label from the file header
         
     Returns:
-        tuple: (delay_column_name, status_column_name)
+        tuple: (is_delay, is_status, is_lsp) for this header
+    """
+    col_lower = str(col).lower().strip()
+    return (
+        # "Delay by" columns, never the "Delay by Bucket" one
+        'delay by' in col_lower and 'bucket' not in col_lower,
+        'current status' in col_lower or col_lower == 'status',
+        col_lower == 'lspname' or ('lsp' in col_lower and 'name' in col_lower)
+    )
+
+
+@lru_cache(maxsize=32)
+def _resolve_column_names(columns: tuple) -> Dict[str, Optional[str]]:
+    """
+    Map the delay, status and LSP roles onto actual column names in one pass.
+    Cached on the column tuple so repeated analyses of the same layout are free.
+    
+    Args:
+        columns: Tuple of DataFrame column labels
         
-    Raises:
-        ValueError: If required columns are not found
+    Returns:
+        dict: {'delay': ..., 'status': ..., 'lsp': ...} (None where not found)
     """
     delay_col = None
+    any_delay_col = None
     status_col = None
+    lsp_col = None
     
-    for col in df.columns:
-        col_lower = str(col).lower().strip()
-        # Look for exact match "delay by" (not "delay by bucket")
-        if col_lower == 'delay by' or (col_lower.startswith('delay by') and 'bucket' not in col_lower):
-            # Prefer columns without "bucket" in the name
-            if 'bucket' not in col_lower:
+    for col in columns:
+        is_delay, is_status, is_lsp = _column_roles(col)
+        if is_delay:
+            # Prefer a column that starts with "Delay by" over one that merely contains it
+            if str(col).lower().strip().startswith('delay by'):
                 delay_col = col
-        if 'current status' in col_lower or col_lower == 'status':
+            if any_delay_col is None:
+                any_delay_col = col
+        if is_status:
             status_col = col
+        if is_lsp:
+            lsp_col = col
     
-    # If still not found, try to find any column with "delay by" (excluding bucket)
-    if delay_col is None:
-        for col in df.columns:
-            col_lower = str(col).lower().strip()
-            if 'delay by' in col_lower and 'bucket' not in col_lower:
-                delay_col = col
-                break
+    return {
+        'delay': delay_col if delay_col is not None else any_delay_col,
+        'status': status_col,
+        'lsp': lsp_col
+    }
+
+
+def is_analysis_column(col) -> bool:
+    """
+    Check whether a column can play the delay, status or LSP role.
+    Used as a ``usecols`` filter so readers skip every other column.
+    
+    Args:
+        col: Column label from the file header
+        
+    Returns:
+        bool: True if the analyzers may need this column
+    """
+    return any(_column_roles(col))
+
+
+def _resolve_columns(df: pd.DataFrame) -> Dict[str, Optional[str]]:
+    """Resolve the delay/status/LSP column names for a DataFrame."""
+    return _resolve_column_names(tuple(df.columns))
+
+
+def find_required_columns(df: pd.DataFrame) -> tuple:
+    """
+    Find the delay and status columns in the dataframe.
+    
+    Args:
+        df: Pandas DataFrame containing the shipment data
+        
+    Returns:
+        tuple: (delay_column_name, status_column_name)
+        
+    Raises:
+        MissingColumnsError: If required columns are not found
+    """
+    columns = _resolve_columns(df)
+    delay_col = columns['delay']
+    status_col = columns['status']
     
     if delay_col is None or status_col is None:
-        raise ValueError(
-            f"Required columns not found. Found columns: {df.columns.tolist()}. "
-            f"Need 'Delay by' column (not 'Delay by Bucket') and 'Current Status' or 'Status' column."
+        raise MissingColumnsError(
+            df.columns.tolist(),
+            "Need 'Delay by' column (not 'Delay by Bucket') and 'Current Status' or 'Status' column."
         )
     
     return delay_col, status_col
 
 
-def process_status_delays(status_df: pd.DataFrame, delay_columns: List[str]) -> Dict:
+def _count_delays(keys: pd.Series, labels: List, bucket_codes: np.ndarray) -> np.ndarray:
     """
-    Process delay data for a specific status.
+    Count delayed rows per (label, delay category) in one fused pass.
+    Key codes and bucket codes are combined into a flat index and counted
+    with a single np.bincount, so no intermediate frame or groupby is built.
     
     Args:
-        status_df: DataFrame filtered for a specific status
-        delay_columns: List of delay category column names
+        keys: Categorical status/LSP column
+        labels: Output row labels, in order; keys outside this list are ignored
+        bucket_codes: Delay bucket code per row from _bucket_codes
         
     Returns:
-        dict: Row data with counts for each delay category
+        np.ndarray: Count matrix of shape (len(labels), len(DELAY_CATEGORIES))
     """
-    row_data = {
-        "delay_by_1_day": None,
-        "delay_by_2_days": None,
-        "delay_by_3_days": None,
-        "delay_by_4_days": None,
-        "delay_by_5_plus_days": None,
-        "grand_total": 0
-    }
+    n_categories = len(DELAY_CATEGORIES)
+    key_codes = keys.cat.set_categories(labels).cat.codes.to_numpy()
+    mask = (key_codes >= 0) & (bucket_codes >= 0)
+    
+    if USE_CUDF and len(key_codes) >= CUDF_MIN_ROWS:
+        counts = _count_delays_gpu(key_codes[mask], bucket_codes[mask], len(labels))
+        if counts is not None:
+            return counts
+    
+    flat_index = key_codes[mask].astype(np.int64) * n_categories + bucket_codes[mask]
+    counts = np.bincount(flat_index, minlength=len(labels) * n_categories)
+    return counts.reshape(len(labels), n_categories)
+
+
+def _count_delays_gpu(key_codes: np.ndarray, bucket_codes: np.ndarray, n_labels: int) -> Optional[np.ndarray]:
+    """
+    GPU variant of _count_delays for very large workbooks, using RAPIDS cuDF.
+    Runs the same (key, bucket) groupby on the device and copies back the sizes.
+    
+    Args:
+        key_codes: Label code per delayed row
+        bucket_codes: Delay bucket code per delayed row
+        n_labels: Number of output row labels
+        
+    Returns:
+        np.ndarray: Count matrix, or None if cuDF is unavailable or fails
+    """
+    try:
+        import cudf
+    except ImportError:
+        logger.warning("USE_CUDF is set but cudf is not installed, counting on CPU")
+        return None
+    
+    try:
+        gdf = cudf.DataFrame({'key': key_codes, 'bucket': bucket_codes})
+        sizes = gdf.groupby(['key', 'bucket']).size().to_pandas()
+    except Exception as e:
+        logger.warning(f"cuDF delay count failed, counting on CPU: {e}")
+        return None
+    
+    counts = np.zeros((n_labels, len(DELAY_CATEGORIES)), dtype=np.int64)
+    counts[sizes.index.get_level_values(0), sizes.index.get_level_values(1)] = sizes.to_numpy()
+    return counts
+
+
+def _summarize_counts(labels: List, counts: np.ndarray, label_key: str) -> tuple:
+    """
+    Turn a (labels x DELAY_CATEGORIES) count matrix into response rows and totals.
+    Zero counts are reported as None; totals come from one column sum.
+    
+    Args:
+        labels: Row labels (statuses or LSP names), in output order
+        counts: Integer count matrix with one row per label
+        label_key: Key for the label in each row ('status' or 'lsp_name')
+        
+    Returns:
+        tuple: (list of row dicts, totals row dict)
+    """
+    result_data = []
+    for label, row, row_total in zip(labels, counts.tolist(), counts.sum(axis=1).tolist()):
+        row_data = {cat: count or None for cat, count in zip(DELAY_CATEGORIES, row)}
+        row_data['grand_total'] = row_total
+        row_data[label_key] = label
+        result_data.append(row_data)
     
-    # Count for each delay category
-    for delay_cat in delay_columns:
-        count = len(status_df[status_df['delay_category'] == delay_cat])
-        if count > 0:
-            row_data[delay_cat] = count
-            row_data['grand_total'] += count
+    col_totals = counts.sum(axis=0).tolist()
+    totals = {label_key: "Grand Total"}
+    totals.update({cat: count or None for cat, count in zip(DELAY_CATEGORIES, col_totals)})
+    totals['grand_total'] = sum(col_totals)
     
-    return row_data
+    return result_data, totals
 
 
 def analyze_delays(df: pd.DataFrame) -> Dict:
@@ -253,23 +417,26 @@ def analyze_delays(df: pd.DataFrame) -> Dict:
     # Find the delay and status columns
     delay_col, status_col = find_required_columns(df)
     
-    # Debug: Print column info
-    print(f"Found columns - Delay: '{delay_col}', Status: '{status_col}'")
-    print(f"Sample delay values: {df[delay_col].head(10).tolist()}")
+    # Debug column info; the sample is only built when DEBUG logging is on
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Found columns - Delay: '{delay_col}', Status: '{status_col}'")
+        logger.debug(f"Sample delay values: {df[delay_col].head(10).tolist()}")
     
     # Clean and convert delay column to numeric
-    df = clean_delay_column(df, delay_col)
+    delays = clean_delay_column(df, delay_col)
     
-    # Add delay category column by parsing numeric values
-    df['delay_category'] = df[delay_col].apply(categorize_delay)
+    # Bucket code per row (-1 for rows without a positive delay)
+    bucket_codes = _bucket_codes(delays.to_numpy(dtype='float32', na_value=np.nan))
+    delayed = bucket_codes >= 0
+    delayed_count = int(np.count_nonzero(delayed))
+    statuses = df[status_col].astype('string[pyarrow]').astype('category')
     
-    # Filter only rows with valid delay categories (positive delays only)
-    df_delayed = df[df['delay_category'].notna()].copy()
+    if logger.isEnabledFor(logging.DEBUG):
+        category_counts = np.bincount(bucket_codes[delayed], minlength=len(DELAY_CATEGORIES))
+        logger.debug(f"Total rows with valid delay categories: {delayed_count}")
+        logger.debug(f"Delay categories found: {dict(zip(DELAY_CATEGORIES, category_counts.tolist()))}")
     
-    print(f"Total rows with valid delay categories: {len(df_delayed)}")
-    print(f"Delay categories found: {df_delayed['delay_category'].value_counts().to_dict()}")
-    
-    if len(df_delayed) == 0:
+    if delayed_count == 0:
         # Return empty structure if no delayed shipments
         return {
             "headers": [
@@ -293,53 +460,18 @@ def analyze_delays(df: pd.DataFrame) -> Dict:
             }
         }
     
-    # Get unique statuses
-    # Get unique statuses from the FULL dataset
-    data_statuses = set(df[status_col].dropna().unique())
-    
-    # Combine predefined statuses with any additional statuses from data
-    # Predefined statuses come first in their specified order
-    all_statuses = PREDEFINED_STATUSES.copy()
+    # Combine predefined statuses with any additional statuses from the FULL
+    # dataset. Predefined statuses come first in their specified order,
+    # followed by the remaining data statuses sorted (hashed set difference)
+    predefined = pd.Index(PREDEFINED_STATUSES)
+    extra_statuses = statuses.cat.categories.difference(predefined, sort=True)
+    all_statuses = predefined.append(extra_statuses).tolist()
     
-    # Add any statuses from data that aren't in the predefined list
-    for status in sorted(data_statuses):
-        if status not in all_statuses:
-            all_statuses.append(status)
-    
-    # Initialize result structure
-    delay_columns = [
-        "delay_by_1_day",
-        "delay_by_2_days", 
-        "delay_by_3_days",
-        "delay_by_4_days",
-        "delay_by_5_plus_days"
-    ]
-    
-    result_data = []
-    totals = {col: 0 for col in delay_columns}
-    totals['grand_total'] = 0
-    
-    # Process each status (including predefined ones that may not exist in data)
-    for status in all_statuses:
-        # Filter delayed shipments for this status
-        status_df = df_delayed[df_delayed[status_col] == status]
-        
-        row_data = process_status_delays(status_df, delay_columns)
-        row_data['status'] = status
-        
-        # Include ALL statuses (predefined + from data)
-        result_data.append(row_data)
-        
-        # Update totals (only count non-zero values)
-        for delay_cat in delay_columns:
-            if row_data[delay_cat] is not None:
-                totals[delay_cat] += row_data[delay_cat]
-        totals['grand_total'] += row_data['grand_total']
+    # Count every (status, delay category) pair in a single pass
+    counts = _count_delays(statuses, all_statuses, bucket_codes)
     
-    # Convert totals to match the response format (None for zero values)
-    for key in delay_columns:
-        if totals[key] == 0:
-            totals[key] = None
+    # Include ALL statuses (predefined + from data)
+    result_data, totals = _summarize_counts(all_statuses, counts, 'status')
     
     # Create the final response
     response = {
@@ -353,42 +485,25 @@ def analyze_delays(df: pd.DataFrame) -> Dict:
             "Grand Total"
         ],
         "data": result_data,
-        "totals": {
-            "status": "Grand Total",
-            **totals
-        }
+        "totals": totals
     }
     
     return response
 
 
 def analyze_delays_by_lsp(df: pd.DataFrame) -> Dict:
-    delay_col = None
-    lsp_col = None
-    
-    for col in df.columns:
-        col_lower = str(col).lower().strip()
-        if col_lower == 'delay by' or (col_lower.startswith('delay by') and 'bucket' not in col_lower):
-            if 'bucket' not in col_lower:
-                delay_col = col
-        if col_lower == 'lspname' or ('lsp' in col_lower and 'name' in col_lower):
-            lsp_col = col
-    
-    if delay_col is None:
-        for col in df.columns:
-            col_lower = str(col).lower().strip()
-            if 'delay by' in col_lower and 'bucket' not in col_lower:
-                delay_col = col
-                break
+    columns = _resolve_columns(df)
+    delay_col = columns['delay']
+    lsp_col = columns['lsp']
     
     if delay_col is None or lsp_col is None:
-        raise ValueError(f"Required columns not found. Found columns: {df.columns.tolist()}. Need 'Delay by' column and 'LSPName' column.")
+        raise MissingColumnsError(df.columns.tolist(), "Need 'Delay by' column and 'LSPName' column.")
     
-    df = clean_delay_column(df, delay_col)
-    df['delay_category'] = df[delay_col].apply(categorize_delay)
-    df_delayed = df[df['delay_category'].notna()].copy()
+    delays = clean_delay_column(df, delay_col)
+    bucket_codes = _bucket_codes(delays.to_numpy(dtype='float32', na_value=np.nan))
+    lsps = df[lsp_col].astype('string[pyarrow]').astype('category')
     
-    if len(df_delayed) == 0:
+    if not (bucket_codes >= 0).any():
         return {
             "headers": ["LSP Name", "Delay by 1 Day", "Delay by 2 Days", "Delay by 3 Days", "Delay by 4 Days", "Delay by >= 5 Days", "Grand Total"],
             "data": [],
@@ -396,38 +511,13 @@ def analyze_delays_by_lsp(df: pd.DataFrame) -> Dict:
         }
     
     # Get unique LSP companies from the data only (no predefined list)
-    data_lsps = df[lsp_col].dropna().unique()
-    all_lsps = sorted(data_lsps)
-    
-    delay_columns = ["delay_by_1_day", "delay_by_2_days", "delay_by_3_days", "delay_by_4_days", "delay_by_5_plus_days"]
-    result_data = []
-    totals = {col: 0 for col in delay_columns}
-    totals['grand_total'] = 0
-    
-    for lsp in all_lsps:
-        lsp_df = df_delayed[df_delayed[lsp_col] == lsp]
-        row_data = {"delay_by_1_day": None, "delay_by_2_days": None, "delay_by_3_days": None, "delay_by_4_days": None, "delay_by_5_plus_days": None, "grand_total": 0}
-        
-        for delay_cat in delay_columns:
-            count = len(lsp_df[lsp_df['delay_category'] == delay_cat])
-            if count > 0:
-                row_data[delay_cat] = count
-                row_data['grand_total'] += count
-        
-        row_data['lsp_name'] = lsp
-        result_data.append(row_data)
-        
-        for delay_cat in delay_columns:
-            if row_data[delay_cat] is not None:
-                totals[delay_cat] += row_data[delay_cat]
-        totals['grand_total'] += row_data['grand_total']
+    all_lsps = lsps.cat.categories.tolist()
     
-    for key in delay_columns:
-        if totals[key] == 0:
-            totals[key] = None
+    counts = _count_delays(lsps, all_lsps, bucket_codes)
+    result_data, totals = _summarize_counts(all_lsps, counts, 'lsp_name')
     
     return {
         "headers": ["LSP Name", "Delay by 1 Day", "Delay by 2 Days", "Delay by 3 Days", "Delay by 4 Days", "Delay by >= 5 Days", "Grand Total"],
         "data": result_data,
-        "totals": {"lsp_name": "Grand Total", **totals}
+        "totals": totals
     }
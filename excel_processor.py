@@ -1,13 +1,46 @@
 """
 Simple Excel processor to find NA values in Delivery Format column
 """
+import numpy as np
 import pandas as pd
 import logging
 from pathlib import Path
 from typing import List, Optional
 
+from config import EXCEL_READ_ENGINE, EXCEL_PARQUET_CACHE
+
 logger = logging.getLogger(__name__)
 
+try:
+    from python_calamine import CalamineError as _EngineReadError
+except ImportError:  # python-calamine not installed, nothing to translate
+    _EngineReadError = ()
+
+
+def read_excel(source, **kwargs) -> pd.DataFrame:
+    """
+    Read an Excel workbook with the fast calamine engine, falling back to
+    pandas' default engine when python-calamine is not installed
+    
+    Args:
+        source: Path or file-like object of the workbook
+        **kwargs: Extra arguments passed through to pd.read_excel
+        
+    Returns:
+        Parsed DataFrame
+        
+    Raises:
+        ValueError: If the content is not a readable workbook
+    """
+    try:
+        return pd.read_excel(source, engine=EXCEL_READ_ENGINE, **kwargs)
+    except _EngineReadError as e:
+        # Match the ValueError pandas raises for unrecognised files
+        raise ValueError(f"Excel file could not be read: {e}") from e
+    except ImportError:
+        logger.warning(f"Excel engine '{EXCEL_READ_ENGINE}' not available, using pandas default")
+        return pd.read_excel(source, **kwargs)
+
 
 class ExcelProcessor:
     """Process Excel files to find LR numbers with NA delivery format"""
@@ -30,40 +63,109 @@ class ExcelProcessor:
             True if successful, False otherwise
         """
         try:
+            sidecar = self._parquet_sidecar()
+            if sidecar is not None and sidecar.exists() and \
+                    sidecar.stat().st_mtime >= Path(self.file_path).stat().st_mtime:
+                logger.info(f"Loading cached Parquet copy: {sidecar}")
+                self.df = pd.read_parquet(sidecar, dtype_backend='pyarrow')
+                logger.info(f"Loaded {len(self.df)} rows")
+                return True
+            
             logger.info(f"Loading Excel file: {self.file_path}")
-            self.df = pd.read_excel(self.file_path)
+            self.df = read_excel(self.file_path, dtype_backend='pyarrow')
             logger.info(f"Loaded {len(self.df)} rows")
+            
+            if sidecar is not None:
+                self._write_parquet_sidecar(sidecar)
+
             logger.info(f"Columns: {list(self.df.columns)}")
             return True
         except Exception as e:
             logger.error(f"Error loading Excel file: {e}")
             return False
     
-    async def get_na_lr_numbers(self) -> List[str]:
+    def _parquet_sidecar(self) -> Optional[Path]:
         """
-        Get LR numbers where Delivery Format is NA
+        Path of the Parquet copy cached next to the Excel file
         
         Returns:
-            List of LR numbers
+            Sidecar path, or None if caching is disabled
+        """
+        if not EXCEL_PARQUET_CACHE:
+            return None
+        path = Path(self.file_path)
+        return path.with_name(f"{path.name}.parquet")
+    
+    def _write_parquet_sidecar(self, sidecar: Path) -> None:
+        """
+        Cache the loaded DataFrame as Parquet so later loads skip Excel parsing
+        
+        Args:
+            sidecar: Destination path of the Parquet file
+        """
+        try:
+            self.df.to_parquet(sidecar, compression='zstd')
+            logger.info(f"Cached Parquet copy: {sidecar}")
+        except Exception as e:
+            # Caching is best-effort (missing pyarrow, mixed-type columns, read-only dir)
+            logger.warning(f"Could not cache Parquet copy of {self.file_path}: {e}")
+            sidecar.unlink(missing_ok=True)
+    
+    async def load_minimal(self, cols: List[str]) -> bool:
+        """
+        Load only the given columns of the Excel file, read as strings
+        
+        Args:
+            cols: Column names to read
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            logger.info(f"Loading columns {cols} from Excel file: {self.file_path}")
+            self.df = read_excel(self.file_path, usecols=cols, dtype={col: str for col in cols})
+            logger.info(f"Loaded {len(self.df)} rows")
+            return True
+        except Exception as e:
+            logger.error(f"Error loading Excel file: {e}")
+            return False
+    
+    async def _get_na_mask(self) -> Optional[np.ndarray]:
+        """
+        Build a boolean mask of rows where Delivery Format is NA
+        
+        Returns:
+            Boolean ndarray, or None if the file or required columns are missing
         """
-        if self.df is None:
+        if self.df is None and not await self.load_minimal(['LrNumber', 'Delivery Format']):
             logger.error("Excel file not loaded")
-            return []
+            return None
         
         # Check if required columns exist
         if 'Delivery Format' not in self.df.columns:
             logger.error("'Delivery Format' column not found")
-            return []
+            return None
         
         if 'LrNumber' not in self.df.columns:
             logger.error("'LrNumber' column not found")
-            return []
+            return None
+        
+        # na_value keeps missing cells False for pyarrow-backed strings
+        return (self.df['Delivery Format'] == 'NA').to_numpy(dtype=bool, na_value=False)
+    
+    async def get_na_lr_numbers(self) -> List[str]:
+        """
+        Get LR numbers where Delivery Format is NA
         
-        # Filter rows where Delivery Format is NA
-        na_rows = self.df[self.df['Delivery Format'] == 'NA']
+        Returns:
+            List of LR numbers
+        """
+        na_mask = await self._get_na_mask()
+        if na_mask is None:
+            return []
         
-        # Get LR numbers
-        lr_numbers = na_rows['LrNumber'].tolist()
+        # Get LR numbers straight from the column, without slicing whole rows
+        lr_numbers = self.df['LrNumber'].to_numpy()[na_mask].tolist()
         
         logger.info(f"Found {len(lr_numbers)} LR numbers with NA Delivery Format")
         return lr_numbers
@@ -75,8 +177,9 @@ class ExcelProcessor:
         Returns:
             LR number or None if not found
         """
-        lr_numbers = await self.get_na_lr_numbers()
+        na_mask = await self._get_na_mask()
+        if na_mask is None or not na_mask.any():
+            return None
         
-        if lr_numbers:
-            return lr_numbers[0]
-        return None
+        # Stop at the first match instead of collecting every NA row
+        return self.df['LrNumber'].iat[int(na_mask.argmax())]
@@ -4,29 +4,37 @@ Finds LR numbers with NA in Delivery Format column
 """
 import asyncio
 import logging
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import List, Optional
+from typing import BinaryIO, List, Optional, Tuple
 from datetime import datetime
 import pandas as pd
 import base64 
+import hashlib
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, Depends, File, UploadFile, HTTPException
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-import requests
+import httpx
+from cachetools import TTLCache
 from typing import Dict, Any
 
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from delay_analyzer import (
     analyze_delays, 
     DelayAnalysisResponse,
     analyze_delays_by_lsp,
-    LSPDelayAnalysisResponse
+    LSPDelayAnalysisResponse,
+    MissingColumnsError,
+    is_analysis_column
 )
 
-from excel_processor import ExcelProcessor
-from config import OUTPUT_DIR, LR_NUMBER_LENGTH, BATCH_SIZE, MAX_CONCURRENT_REQUESTS
-from tracking_api import track_multiple_lr_numbers
+from excel_processor import ExcelProcessor, read_excel
+from config import OUTPUT_DIR, LR_NUMBER_LENGTH, BATCH_SIZE, MAX_CONCURRENT_REQUESTS, TOKEN_CACHE_TTL, EXCEL_WRITE_ENGINE
+from config import ANALYSIS_CACHE_SIZE, ANALYSIS_CACHE_TTL, CORS_ORIGINS, GZIP_MIN_SIZE
+from config import SERVER_HOST, SERVER_PORT, SERVER_RELOAD, SERVER_WORKERS, SERVER_LOOP, SERVER_HTTP
+from tracking_api import track_multiple_lr_numbers, close_session as close_tracking_session
 import io
 
 # Set up logging
@@ -36,19 +44,42 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create shared HTTP clients on startup and close them on shutdown"""
+    # Long-lived client so token requests reuse pooled TLS connections
+    app.state.http_client = httpx.AsyncClient(
+        timeout=30,
+        follow_redirects=True,
+        limits=httpx.Limits(max_keepalive_connections=20)
+    )
+    try:
+        yield
+    finally:
+        await app.state.http_client.aclose()
+        # Tracking session is created lazily on first use
+        await close_tracking_session()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="LR Number Lookup System",
     description="Find LR numbers with NA in Delivery Format column",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 
 # Added later additional middleware
+# Delay analysis responses embed a large HTML table and compress very well
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_SIZE)
+# Credentials are only allowed with explicit origins; with "*" Starlette would have
+# to echo the request Origin back on every response
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
+    allow_origins=CORS_ORIGINS,
+    allow_credentials="*" not in CORS_ORIGINS,
     allow_methods=["*"],
     allow_headers=["*"],
 )
@@ -109,42 +140,79 @@ class TokenResponse(BaseModel):
     result: str
 
 
-def generate_safexpress_token() -> Dict[str, Any]:
+SAFEXPRESS_TOKEN_URL = 'https://dgapi.safexpress.com/sfxweb/waybillinvoicetracking/v1/getpropeliauth2token'
+
+SAFEXPRESS_TOKEN_HEADERS = {
+    'accept': 'application/json, text/plain, */*',
+    'accept-language': 'en-GB,en-US;q=0.9,en;q=0.8,es;q=0.7',
+    'dnt': '1',
+    'origin': 'https://www.safexpress.com',
+    'priority': 'u=1, i',
+    'referer': 'https://www.safexpress.com/',
+    'sec-ch-ua': '"Google Chrome";v="143", "Chromium";v="143", "Not A(Brand";v="24"',
+    'sec-ch-ua-mobile': '?0',
+    'sec-ch-ua-platform': '"Windows"',
+    'sec-fetch-dest': 'empty',
+    'sec-fetch-mode': 'cors',
+    'sec-fetch-site': 'same-site',
+    'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/143.0.0.0 Safari/537.36'
+}
+
+
+# Successful token responses are reused until the TTL expires
+_TOKEN_CACHE = TTLCache(maxsize=1, ttl=TOKEN_CACHE_TTL)
+_TOKEN_LOCK = asyncio.Lock()
+
+
+def is_token_success(token_data: Dict[str, Any]) -> bool:
+    """Check whether a token response reports success"""
+    # The API reports success in 'status'; 'result' is kept for older responses
+    return token_data.get('status') == 'success' or token_data.get('result') == 'success'
+
+
+async def generate_safexpress_token(client: httpx.AsyncClient) -> Dict[str, Any]:
     """
-    Generate authentication token from SafExpress API.
+    Generate authentication token from SafExpress API, served from cache when fresh.
+    Concurrent cache misses wait on one lock so only a single upstream call is made.
+    
+    Args:
+        client: Shared httpx client from app state
     
     Returns:
         dict: Response containing the token and status information
     """
-    url = 'https://dgapi.safexpress.com/sfxweb/waybillinvoicetracking/v1/getpropeliauth2token'
-    
-    headers = {
-        'accept': 'application/json, text/plain, */*',
-        'accept-language': 'en-GB,en-US;q=0.9,en;q=0.8,es;q=0.7',
-        'dnt': '1',
-        'origin': 'https://www.safexpress.com',
-        'priority': 'u=1, i',
-        'referer': 'https://www.safexpress.com/',
-        'sec-ch-ua': '"Google Chrome";v="143", "Chromium";v="143", "Not A(Brand";v="24"',
-        'sec-ch-ua-mobile': '?0',
-        'sec-ch-ua-platform': '"Windows"',
-        'sec-fetch-dest': 'empty',
-        'sec-fetch-mode': 'cors',
-        'sec-fetch-site': 'same-site',
-        'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/143.0.0.0 Safari/537.36'
-    }
+    token_data = _TOKEN_CACHE.get("token")
+    if token_data is not None:
+        return token_data
+    
+    async with _TOKEN_LOCK:
+        # Another request may have refreshed the token while we waited
+        token_data = _TOKEN_CACHE.get("token")
+        if token_data is not None:
+            return token_data
+        
+        token_data = await fetch_safexpress_token(client)
+        if is_token_success(token_data):
+            _TOKEN_CACHE["token"] = token_data
+        return token_data
+
+
+async def fetch_safexpress_token(client: httpx.AsyncClient) -> Dict[str, Any]:
+    """
+    Request a fresh authentication token from SafExpress API.
     
+    Args:
+        client: Shared httpx client from app state
+    
+    Returns:
+        dict: Response containing the token and status information
+    """
     try:
-        response = requests.get(
-            url,
-            headers=headers,
-            timeout=30,
-            allow_redirects=True
-        )
+        response = await client.get(SAFEXPRESS_TOKEN_URL, headers=SAFEXPRESS_TOKEN_HEADERS)
         response.raise_for_status()
         return response.json()
     
-    except requests.exceptions.RequestException as e:
+    except (httpx.HTTPError, ValueError) as e:
         return {
             "msg": "",
             "error": str(e),
@@ -157,16 +225,15 @@ def generate_safexpress_token() -> Dict[str, Any]:
 async def get_safexpress_token():
     """
     Generate SafExpress authentication token.
+    The upstream payload is passed through unchanged (null or extra fields included).
     
     Returns:
         TokenResponse: Contains the authentication token and status
     """
-    token_data = generate_safexpress_token()
+    token_data = await generate_safexpress_token(app.state.http_client)
     
-    if token_data.get('result') == 'success':
-        return JSONResponse(content=token_data, status_code=200)
-    else:
-        return JSONResponse(content=token_data, status_code=500)
+    status_code = 200 if is_token_success(token_data) else 500
+    return JSONResponse(content=token_data, status_code=status_code)
 
 
 @app.get("/")
@@ -182,242 +249,188 @@ async def root():
     }
 
 
-@app.post("/process", response_model=LRNumbersResponse)
-async def process_excel(file: UploadFile = File(..., description="Excel file to process")):
+class FileUploadBase64(BaseModel):
+    file: str  # base64 encoded file content
+    filename: str  # original filename
+
+
+# Accepted upload types: /process needs a workbook, the delay analyses also take CSV
+EXCEL_EXTENSIONS = ('.xlsx', '.xls')
+ANALYSIS_EXTENSIONS = ('.xlsx', '.xls', '.csv')
+EXCEL_TYPE_ERROR = "Invalid file type. Please upload an Excel file (.xlsx or .xls)"
+ANALYSIS_TYPE_ERROR = "Unsupported file format. Please upload .xlsx, .xls, or .csv file"
+
+
+def _require_extension(filename: str, extensions: Tuple[str, ...], detail: str) -> None:
+    """Reject uploads whose filename does not end with one of the allowed extensions"""
+    if not filename.endswith(extensions):
+        raise HTTPException(status_code=400, detail=detail)
+
+
+def _decode_base64(data: FileUploadBase64) -> BinaryIO:
+    """Decode a base64 upload into a binary file object"""
+    try:
+        return io.BytesIO(base64.b64decode(data.file))
+    except Exception as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid base64 encoding: {str(e)}"
+        )
+
+
+async def _spooled_upload(file: UploadFile) -> Tuple[BinaryIO, str]:
     """
-    Process Excel file, track LR numbers, update statuses, and return updated file
+    Hand out the spooled upload as-is. UploadFile is already buffered in memory,
+    then on disk, so it is parsed in place instead of copied into one bytes object.
+    """
+    await file.seek(0)
+    return file.file, file.filename
+
+
+async def excel_upload(file: UploadFile = File(..., description="Excel file to process")) -> Tuple[BinaryIO, str]:
+    """Dependency: validated Excel upload as (file object, filename)"""
+    _require_extension(file.filename, EXCEL_EXTENSIONS, EXCEL_TYPE_ERROR)
+    return await _spooled_upload(file)
+
+
+async def excel_upload_base64(data: FileUploadBase64) -> Tuple[BinaryIO, str]:
+    """Dependency: validated base64 Excel upload as (file object, filename)"""
+    _require_extension(data.filename, EXCEL_EXTENSIONS, EXCEL_TYPE_ERROR)
+    return _decode_base64(data), data.filename
+
+
+async def analysis_upload(file: UploadFile = File(...)) -> Tuple[BinaryIO, str]:
+    """Dependency: validated Excel/CSV upload for delay analysis as (file object, filename)"""
+    _require_extension(file.filename, ANALYSIS_EXTENSIONS, ANALYSIS_TYPE_ERROR)
+    return await _spooled_upload(file)
+
+
+async def analysis_upload_base64(data: FileUploadBase64) -> Tuple[BinaryIO, str]:
+    """Dependency: validated base64 Excel/CSV upload for delay analysis as (file object, filename)"""
+    _require_extension(data.filename, ANALYSIS_EXTENSIONS, ANALYSIS_TYPE_ERROR)
+    return _decode_base64(data), data.filename
+
+
+async def _run_lr_pipeline(source: BinaryIO, filename: str) -> LRNumbersResponse:
+    """
+    Track LR numbers with missing Delivery Format and save the updated workbook
     
     Args:
-        file: Excel file upload
+        source: Binary file object positioned at the start of the Excel content
+        filename: Original filename, used to name the output file
         
     Returns:
-        Processing results with download link to updated Excel file
+        Processing results with path to the updated Excel file
     """
-    # Validate file type
-    if not file.filename.endswith(('.xlsx', '.xls')):
-        raise HTTPException(
-            status_code=400,
-            detail="Invalid file type. Please upload an Excel file (.xlsx or .xls)"
-        )
+    logger.info(f"File uploaded: {filename}")
     
-    try:
-        # Save uploaded file temporarily
-        temp_dir = Path("temp_uploads")
-        temp_dir.mkdir(exist_ok=True)
-        temp_file_path = temp_dir / file.filename
-        
-        with open(temp_file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        logger.info(f"File uploaded: {file.filename}")
-        
-        # Read Excel file, enforcing string for LrNumber to avoid scientific notation
-        df = pd.read_excel(temp_file_path, dtype={'LrNumber': str})
-        logger.info(f"Loaded {len(df)} rows")
+    # Read Excel file, enforcing string for LrNumber to avoid scientific notation.
+    # Parsing runs in a worker thread so the event loop keeps serving other requests
+    df = await asyncio.to_thread(read_excel, source, dtype={'LrNumber': str})
+    logger.info(f"Loaded {len(df)} rows")
 
-        # Finding missing delivery formats
-        missing_delivery_mask = df['Delivery Format'].isna()
-        all_lr_numbers = df.loc[missing_delivery_mask, 'LrNumber'].astype(str).tolist()
-        
-        # Validate LR numbers by length
-        valid_lr_numbers = [lr for lr in all_lr_numbers if len(lr) == LR_NUMBER_LENGTH]
-        invalid_lr_numbers = [lr for lr in all_lr_numbers if len(lr) != LR_NUMBER_LENGTH]
-        
-        logger.info(f"Total LR numbers: {len(all_lr_numbers)}, Valid: {len(valid_lr_numbers)}, Invalid: {len(invalid_lr_numbers)}")
-        
-        # Track statuses for valid LR numbers in parallel
-        if valid_lr_numbers:
-            logger.info(f"Fetching statuses for {len(valid_lr_numbers)} LR numbers...")
-            tracking_results = await track_multiple_lr_numbers(
-                valid_lr_numbers,
-                max_concurrent=MAX_CONCURRENT_REQUESTS
-            )
-            
-            # Update Excel file with statuses
-            statuses_updated = 0
-            for lr_number, result in tracking_results.items():
-                status = result.get('status', 'ERROR')
-                
-                # Find rows with this LR number and update Current Status
-                lr_mask = (df['LrNumber'].astype(str) == lr_number) & missing_delivery_mask
-                if lr_mask.any():
-                    df.loc[lr_mask, 'Current Status'] = status
-                    # Convert Delivery Format to string to avoid dtype warning
-                    df['Delivery Format'] = df['Delivery Format'].astype(str)
-                    df.loc[lr_mask, 'Delivery Format'] = 'done'
-                    statuses_updated += 1
-                    logger.info(f"Updated LR {lr_number}: {status}")
-            
-            # Save updated Excel file
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_filename = f"{Path(file.filename).stem}_updated_{timestamp}.xlsx"
-            output_path = OUTPUT_DIR / output_filename
-            
-            df.to_excel(output_path, index=False)
-            logger.info(f"Saved updated file to: {output_path}")
-        else:
-            statuses_updated = 0
-            output_path = None
-        
-        # Process batches info
-        processing_info = await process_lr_batch(
-            valid_lr_numbers, 
-            batch_size=BATCH_SIZE
+    # Cast LrNumber to string once; blank cells become '' (astype(str) alone keeps NaN) and fail the length check
+    lr_strings = df['LrNumber'].fillna('').astype(str)
+    
+    # Finding missing delivery formats
+    missing_delivery_mask = df['Delivery Format'].isna()
+    na_lr_numbers = lr_strings[missing_delivery_mask]
+    
+    # Validate LR numbers by length in one vectorized pass
+    valid_length_mask = na_lr_numbers.str.len() == LR_NUMBER_LENGTH
+    valid_lr_numbers = na_lr_numbers[valid_length_mask].tolist()
+    invalid_lr_numbers = na_lr_numbers[~valid_length_mask].tolist()
+    
+    logger.info(f"Total LR numbers: {len(na_lr_numbers)}, Valid: {len(valid_lr_numbers)}, Invalid: {len(invalid_lr_numbers)}")
+    
+    # Track statuses for valid LR numbers in parallel
+    if valid_lr_numbers:
+        logger.info(f"Fetching statuses for {len(valid_lr_numbers)} LR numbers...")
+        tracking_results = await track_multiple_lr_numbers(
+            valid_lr_numbers,
+            max_concurrent=MAX_CONCURRENT_REQUESTS
         )
-        processing_info['max_concurrent'] = MAX_CONCURRENT_REQUESTS
-        processing_info['valid_lr_count'] = len(valid_lr_numbers)
-        processing_info['invalid_lr_count'] = len(invalid_lr_numbers)
-        processing_info['lr_number_length_required'] = LR_NUMBER_LENGTH
-        processing_info['statuses_fetched'] = len(tracking_results) if valid_lr_numbers else 0
-        
-        # Clean up temp file
-        try:
-            temp_file_path.unlink()
-        except:
-            pass    
         
-        return LRNumbersResponse(
-            total_records=len(df),
-            na_count=len(all_lr_numbers),
-            valid_lr_numbers=valid_lr_numbers,
-            invalid_lr_numbers=invalid_lr_numbers,
-            first_valid_lr_number=valid_lr_numbers[0] if valid_lr_numbers else None,
-            processing_info=processing_info,
-            statuses_updated=statuses_updated,
-            output_file=str(output_path) if output_path else None
-        )
+        # Update Excel file with statuses in a single vectorized pass
+        status_map = {lr: result.status for lr, result in tracking_results.items()}
+        target_mask = missing_delivery_mask & lr_strings.isin(status_map)
+        statuses_updated = int(lr_strings[target_mask].nunique())
+        if statuses_updated:
+            # Widen both columns to object once so strings fit any inferred dtype (an all-blank
+            # column reads as float64); unlike astype(str) this keeps untouched blanks empty
+            df['Current Status'] = df['Current Status'].astype(object)
+            df.loc[target_mask, 'Current Status'] = lr_strings[target_mask].map(status_map)
+            df['Delivery Format'] = df['Delivery Format'].astype(object)
+            df.loc[target_mask, 'Delivery Format'] = 'done'
+        logger.info(f"Updated statuses for {statuses_updated} LR numbers")
+        
+        # Save updated Excel file
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_filename = f"{Path(filename).stem}_updated_{timestamp}.xlsx"
+        output_path = OUTPUT_DIR / output_filename
+        
+        # xlsxwriter streams rows out instead of building an openpyxl workbook in memory
+        await asyncio.to_thread(df.to_excel, output_path, index=False, engine=EXCEL_WRITE_ENGINE)
+        logger.info(f"Saved updated file to: {output_path}")
+    else:
+        statuses_updated = 0
+        output_path = None
+    
+    # Process batches info
+    processing_info = await process_lr_batch(
+        valid_lr_numbers, 
+        batch_size=BATCH_SIZE
+    )
+    processing_info['max_concurrent'] = MAX_CONCURRENT_REQUESTS
+    processing_info['valid_lr_count'] = len(valid_lr_numbers)
+    processing_info['invalid_lr_count'] = len(invalid_lr_numbers)
+    processing_info['lr_number_length_required'] = LR_NUMBER_LENGTH
+    processing_info['statuses_fetched'] = len(tracking_results) if valid_lr_numbers else 0
+    
+    return LRNumbersResponse(
+        total_records=len(df),
+        na_count=len(na_lr_numbers),
+        valid_lr_numbers=valid_lr_numbers,
+        invalid_lr_numbers=invalid_lr_numbers,
+        first_valid_lr_number=valid_lr_numbers[0] if valid_lr_numbers else None,
+        processing_info=processing_info,
+        statuses_updated=statuses_updated,
+        output_file=str(output_path) if output_path else None
+    )
+
+
+@app.post("/process", response_model=LRNumbersResponse)
+async def process_excel(upload: Tuple[BinaryIO, str] = Depends(excel_upload)):
+    """
+    Process Excel file, track LR numbers, update statuses, and return updated file
+    
+    Args:
+        upload: Validated Excel upload as (file object, filename)
         
+    Returns:
+        Processing results with download link to updated Excel file
+    """
+    try:
+        return await _run_lr_pipeline(*upload)
     except Exception as e:
         logger.error(f"Error processing file: {e}")
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
 
 
-
-
-
-class FileUploadBase64(BaseModel):
-    file: str  # base64 encoded file content
-    filename: str  # original filename
-
-
-
-
 # Add NEW endpoint for base64 input from Power Automate
 @app.post("/process-base64", response_model=LRNumbersResponse)
-async def process_excel_base64(data: FileUploadBase64):
+async def process_excel_base64(upload: Tuple[BinaryIO, str] = Depends(excel_upload_base64)):
     """
     Process Excel file from base64 encoded content (for Power Automate)
     
     Args:
-        data: JSON with base64 encoded file and filename
+        upload: Decoded Excel upload as (file object, filename)
         
     Returns:
         Processing results with download link to updated Excel file
     """
-    # Validate file type
-    if not data.filename.endswith(('.xlsx', '.xls')):
-        raise HTTPException(
-            status_code=400,
-            detail="Invalid file type. Please upload an Excel file (.xlsx or .xls)"
-        )
-    
     try:
-        # Decode base64 to bytes
-        try:
-            file_content = base64.b64decode(data.file)
-        except Exception as e:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid base64 encoding: {str(e)}"
-            )
-        
-        # Save uploaded file temporarily
-        temp_dir = Path("temp_uploads")
-        temp_dir.mkdir(exist_ok=True)
-        temp_file_path = temp_dir / data.filename
-        
-        with open(temp_file_path, "wb") as buffer:
-            buffer.write(file_content)
-        
-        logger.info(f"File uploaded: {data.filename}")
-        
-        # Read Excel file, enforcing string for LrNumber to avoid scientific notation
-        df = pd.read_excel(temp_file_path, dtype={'LrNumber': str})
-        logger.info(f"Loaded {len(df)} rows")
-
-        # Finding missing delivery formats
-        missing_delivery_mask = df['Delivery Format'].isna()
-        all_lr_numbers = df.loc[missing_delivery_mask, 'LrNumber'].astype(str).tolist()
-        
-        # Validate LR numbers by length
-        valid_lr_numbers = [lr for lr in all_lr_numbers if len(lr) == LR_NUMBER_LENGTH]
-        invalid_lr_numbers = [lr for lr in all_lr_numbers if len(lr) != LR_NUMBER_LENGTH]
-        
-        logger.info(f"Total LR numbers: {len(all_lr_numbers)}, Valid: {len(valid_lr_numbers)}, Invalid: {len(invalid_lr_numbers)}")
-        
-        # Track statuses for valid LR numbers in parallel
-        if valid_lr_numbers:
-            logger.info(f"Fetching statuses for {len(valid_lr_numbers)} LR numbers...")
-            tracking_results = await track_multiple_lr_numbers(
-                valid_lr_numbers,
-                max_concurrent=MAX_CONCURRENT_REQUESTS
-            )
-            
-            # Update Excel file with statuses
-            statuses_updated = 0
-            for lr_number, result in tracking_results.items():
-                status = result.get('status', 'ERROR')
-                
-                # Find rows with this LR number and update Current Status
-                lr_mask = (df['LrNumber'].astype(str) == lr_number) & missing_delivery_mask
-                if lr_mask.any():
-                    df.loc[lr_mask, 'Current Status'] = status
-                    # Convert Delivery Format to string to avoid dtype warning
-                    df['Delivery Format'] = df['Delivery Format'].astype(str)
-                    df.loc[lr_mask, 'Delivery Format'] = 'done'
-                    statuses_updated += 1
-                    logger.info(f"Updated LR {lr_number}: {status}")
-            
-            # Save updated Excel file
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_filename = f"{Path(data.filename).stem}_updated_{timestamp}.xlsx"
-            output_path = OUTPUT_DIR / output_filename
-            
-            df.to_excel(output_path, index=False)
-            logger.info(f"Saved updated file to: {output_path}")
-        else:
-            statuses_updated = 0
-            output_path = None
-        
-        # Process batches info
-        processing_info = await process_lr_batch(
-            valid_lr_numbers, 
-            batch_size=BATCH_SIZE
-        )
-        processing_info['max_concurrent'] = MAX_CONCURRENT_REQUESTS
-        processing_info['valid_lr_count'] = len(valid_lr_numbers)
-        processing_info['invalid_lr_count'] = len(invalid_lr_numbers)
-        processing_info['lr_number_length_required'] = LR_NUMBER_LENGTH
-        processing_info['statuses_fetched'] = len(tracking_results) if valid_lr_numbers else 0
-        
-        # Clean up temp file
-        try:
-            temp_file_path.unlink()
-        except:
-            pass    
-        
-        return LRNumbersResponse(
-            total_records=len(df),
-            na_count=len(all_lr_numbers),
-            valid_lr_numbers=valid_lr_numbers,
-            invalid_lr_numbers=invalid_lr_numbers,
-            first_valid_lr_number=valid_lr_numbers[0] if valid_lr_numbers else None,
-            processing_info=processing_info,
-            statuses_updated=statuses_updated,
-            output_file=str(output_path) if output_path else None
-        )
-        
+        return await _run_lr_pipeline(*upload)
     except Exception as e:
         logger.error(f"Error processing file: {e}")
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
@@ -426,7 +439,7 @@ async def process_excel_base64(data: FileUploadBase64):
 
 # NEW ENDPOINT: Base64 version for Power Automate
 @app.post("/analyze-delays-base64", response_model=DelayAnalysisResponse, response_model_exclude_none=False)
-async def analyze_delay_file_base64(data: FileUploadBase64):
+async def analyze_delay_file_base64(upload: Tuple[BinaryIO, str] = Depends(analysis_upload_base64)):
     """
     Upload an Excel file (as base64) to analyze shipment delays.
     For Power Automate integration.
@@ -439,39 +452,15 @@ async def analyze_delay_file_base64(data: FileUploadBase64):
     - JSON structure with delay analysis categorized by status and delay duration
     """
     try:
-        # Decode base64 to bytes
-        try:
-            file_content = base64.b64decode(data.file)
-        except Exception as e:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid base64 encoding: {str(e)}"
-            )
-        
-        # Determine file type and read accordingly
-        if data.filename.endswith('.xlsx') or data.filename.endswith('.xls'):
-            df = pd.read_excel(io.BytesIO(file_content))
-        elif data.filename.endswith('.csv'):
-            df = pd.read_csv(io.BytesIO(file_content))
-        else:
-            raise HTTPException(
-                status_code=400,
-                detail="Unsupported file format. Please upload .xlsx, .xls, or .csv file"
-            )
-        
-        # Analyze delays using the logic from delay_analyzer.py
-        result = analyze_delays(df)
-        
-        html_table = build_html_table(result)
-        result["html_table"] = html_table
-
-        # write the table HTML into file to test
-        with open("testAnalyzedTable.html", "w", encoding="utf-8") as f:
-            f.write(result["html_table"])
+        # Analyze delays using the logic from delay_analyzer.py, reusing the cached result for repeated uploads
+        result = await _analyze_upload(*upload, analyze_delays, build_html_table)
 
-        print(f"Result Returned from delay analyzation API (base64): {result}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Result Returned from delay analyzation API (base64): {result}")
         return result
     
+    except HTTPException:
+        raise
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
@@ -481,120 +470,187 @@ async def analyze_delay_file_base64(data: FileUploadBase64):
 
 
     
-def build_html_table(response_json: dict) -> str:
-    headers = response_json["headers"]
-    rows = response_json["data"]
-    totals = response_json.get("totals")
-
-    def safe(val):
-        return "-" if val is None else val
-
-    html = """
+# HTML table fragments shared by the delay table builders, built once at import
+_HTML_TABLE_OPEN = """
 <table width="100%" cellpadding="8" cellspacing="0"
 style="border-collapse:collapse;font-family:Arial,sans-serif;
 font-size:13px;border:1px solid #cccccc;">
 """
-
-    # Header row
-    html += "<tr style='background-color:#2f80ed;color:#ffffff;font-weight:bold;'>"
-    for h in headers:
-        html += f"""
+_HTML_HEADER_ROW_OPEN = "<tr style='background-color:{color};color:#ffffff;font-weight:bold;'>"
+_HTML_HEADER_CELL = """
         <th style="border:1px solid #cccccc;text-align:center;">
-            {h}
+            {}
         </th>
         """
-    html += "</tr>"
+_DELAY_FIELDS = (
+    'delay_by_1_day',
+    'delay_by_2_days',
+    'delay_by_3_days',
+    'delay_by_4_days',
+    'delay_by_5_plus_days',
+)
+_HTML_DELAY_CELLS = "".join(
+    f"<td style='border:1px solid #cccccc;text-align:center;'>{{{field}}}</td>" for field in _DELAY_FIELDS
+)
+_HTML_ROW_TEMPLATE = (
+    "<tr style='background-color:{bg};'>"
+    "<td style='border:1px solid #cccccc;font-weight:500;'>{label}</td>"
+    + _HTML_DELAY_CELLS
+    + "<td style='border:1px solid #cccccc;text-align:center;font-weight:bold;'>{grand_total}</td>"
+    "</tr>"
+)
+_HTML_TOTALS_TEMPLATE = (
+    """
+<tr style="background-color:{bg};font-weight:bold;">
+"""
+    "<td style='border:1px solid #cccccc;'>{label}</td>"
+    + _HTML_DELAY_CELLS
+    + "<td style='border:1px solid #cccccc;text-align:center;color:{total_color};'>{grand_total}</td>"
+    "</tr>"
+)
+
+
+def _build_delay_html_table(
+    response_json: dict,
+    label_key: str,
+    header_color: str,
+    totals_bg: str,
+    totals_color: str
+) -> str:
+    """
+    Render a delay analysis response as an email-friendly HTML table
+    
+    Args:
+        response_json: Analysis result with headers, data and optional totals
+        label_key: Row key holding the first column label ('status' or 'lsp_name')
+        header_color: Background color of the header row
+        totals_bg: Background color of the totals row
+        totals_color: Text color of the totals grand total cell
+        
+    Returns:
+        HTML table markup
+    """
+    headers = response_json["headers"]
+    rows = response_json["data"]
+    totals = response_json.get("totals")
+
+    def cells(row: dict) -> dict:
+        values = {field: "-" if row[field] is None else row[field] for field in _DELAY_FIELDS}
+        values['label'] = row[label_key]
+        values['grand_total'] = row['grand_total']
+        return values
+
+    parts = [_HTML_TABLE_OPEN, _HTML_HEADER_ROW_OPEN.format(color=header_color)]
+    parts.extend(_HTML_HEADER_CELL.format(h) for h in headers)
+    parts.append("</tr>")
 
     # Data rows with zebra striping
     for i, row in enumerate(rows):
         bg = "#ffffff" if i % 2 == 0 else "#f9fafb"
-        html += f"<tr style='background-color:{bg};'>"
-        html += f"<td style='border:1px solid #cccccc;font-weight:500;'>{row['status']}</td>"
-        html += f"<td style='border:1px solid #cccccc;text-align:center;'>{safe(row['delay_by_1_day'])}</td>"
-        html += f"<td style='border:1px solid #cccccc;text-align:center;'>{safe(row['delay_by_2_days'])}</td>"
-        html += f"<td style='border:1px solid #cccccc;text-align:center;'>{safe(row['delay_by_3_days'])}</td>"
-        html += f"<td style='border:1px solid #cccccc;text-align:center;'>{safe(row['delay_by_4_days'])}</td>"
-        html += f"<td style='border:1px solid #cccccc;text-align:center;'>{safe(row['delay_by_5_plus_days'])}</td>"
-        html += f"<td style='border:1px solid #cccccc;text-align:center;font-weight:bold;'>{row['grand_total']}</td>"
-        html += "</tr>"
+        parts.append(_HTML_ROW_TEMPLATE.format_map({'bg': bg, **cells(row)}))
 
     # Totals row
     if totals:
-        html += """
-<tr style="background-color:#fff3cd;font-weight:bold;">
-"""
-        html += f"<td style='border:1px solid #cccccc;'>{totals['status']}</td>"
-        html += f"<td style='border:1px solid #cccccc;text-align:center;'>{safe(totals['delay_by_1_day'])}</td>"
-        html += f"<td style='border:1px solid #cccccc;text-align:center;'>{safe(totals['delay_by_2_days'])}</td>"
-        html += f"<td style='border:1px solid #cccccc;text-align:center;'>{safe(totals['delay_by_3_days'])}</td>"
-        html += f"<td style='border:1px solid #cccccc;text-align:center;'>{safe(totals['delay_by_4_days'])}</td>"
-        html += f"<td style='border:1px solid #cccccc;text-align:center;'>{safe(totals['delay_by_5_plus_days'])}</td>"
-        html += f"<td style='border:1px solid #cccccc;text-align:center;color:#b45309;'>{totals['grand_total']}</td>"
-        html += "</tr>"
+        parts.append(_HTML_TOTALS_TEMPLATE.format_map({'bg': totals_bg, 'total_color': totals_color, **cells(totals)}))
+
+    parts.append("</table>")
+    return "".join(parts)
 
-    html += "</table>"
-    return html
 
+def build_html_table(response_json: dict) -> str:
+    return _build_delay_html_table(response_json, 'status', '#2f80ed', '#fff3cd', '#b45309')
 
 
 def build_lsp_html_table(response_json: dict) -> str:
-    headers = response_json["headers"]
-    rows = response_json["data"]
-    totals = response_json.get("totals")
+    return _build_delay_html_table(response_json, 'lsp_name', '#27ae60', '#e6fffa', '#065f46')
 
-    def safe(val):
-        return "-" if val is None else val
 
-    html = """
-<table width="100%" cellpadding="8" cellspacing="0"
-style="border-collapse:collapse;font-family:Arial,sans-serif;
-font-size:13px;border:1px solid #cccccc;">
-"""
 
-    # Header
-    html += "<tr style='background-color:#27ae60;color:#ffffff;font-weight:bold;'>"
-    for h in headers:
-        html += f"""
-        <th style="border:1px solid #cccccc;text-align:center;">
-            {h}
-        </th>
-        """
-    html += "</tr>"
+# Analysis results keyed by (analyzer, file type, content hash); repeated uploads skip parsing
+_ANALYSIS_CACHE = TTLCache(maxsize=ANALYSIS_CACHE_SIZE, ttl=ANALYSIS_CACHE_TTL)
+_ANALYSIS_LOCKS: Dict[tuple, asyncio.Lock] = {}
 
-    # Data rows
-    for i, row in enumerate(rows):
-        bg = "#ffffff" if i % 2 == 0 else "#f9fafb"
-        html += f"<tr style='background-color:{bg};'>"
-        html += f"<td style='border:1px solid #cccccc;font-weight:500;'>{row['lsp_name']}</td>"
-        html += f"<td style='border:1px solid #cccccc;text-align:center;'>{safe(row['delay_by_1_day'])}</td>"
-        html += f"<td style='border:1px solid #cccccc;text-align:center;'>{safe(row['delay_by_2_days'])}</td>"
-        html += f"<td style='border:1px solid #cccccc;text-align:center;'>{safe(row['delay_by_3_days'])}</td>"
-        html += f"<td style='border:1px solid #cccccc;text-align:center;'>{safe(row['delay_by_4_days'])}</td>"
-        html += f"<td style='border:1px solid #cccccc;text-align:center;'>{safe(row['delay_by_5_plus_days'])}</td>"
-        html += f"<td style='border:1px solid #cccccc;text-align:center;font-weight:bold;'>{row['grand_total']}</td>"
-        html += "</tr>"
 
-    # Totals row
-    if totals:
-        html += """
-<tr style="background-color:#e6fffa;font-weight:bold;">
-"""
-        html += f"<td style='border:1px solid #cccccc;'>{totals['lsp_name']}</td>"
-        html += f"<td style='border:1px solid #cccccc;text-align:center;'>{safe(totals['delay_by_1_day'])}</td>"
-        html += f"<td style='border:1px solid #cccccc;text-align:center;'>{safe(totals['delay_by_2_days'])}</td>"
-        html += f"<td style='border:1px solid #cccccc;text-align:center;'>{safe(totals['delay_by_3_days'])}</td>"
-        html += f"<td style='border:1px solid #cccccc;text-align:center;'>{safe(totals['delay_by_4_days'])}</td>"
-        html += f"<td style='border:1px solid #cccccc;text-align:center;'>{safe(totals['delay_by_5_plus_days'])}</td>"
-        html += f"<td style='border:1px solid #cccccc;text-align:center;color:#065f46;'>{totals['grand_total']}</td>"
-        html += "</tr>"
+def _hash_upload(source: BinaryIO) -> str:
+    """
+    Hash the full content of an upload and rewind it for parsing
+    
+    Args:
+        source: Binary file object positioned at the start of the upload
+        
+    Returns:
+        Hex digest of the content
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for chunk in iter(lambda: source.read(1 << 20), b''):
+        digest.update(chunk)
+    source.seek(0)
+    return digest.hexdigest()
 
-    html += "</table>"
-    return html
 
+def _read_and_analyze(reader, source: BinaryIO, analyzer) -> dict:
+    """
+    Read only the analysis columns of an upload and run the analyzer on them.
+    
+    Args:
+        reader: read_excel or pd.read_csv
+        source: Binary file object positioned at the start of the upload
+        analyzer: analyze_delays or analyze_delays_by_lsp
+        
+    Returns:
+        Analysis result
+    """
+    df = reader(source, usecols=is_analysis_column)
+    try:
+        return analyzer(df)
+    except MissingColumnsError as e:
+        # usecols hid every other header from the message; re-read just the header row
+        # so the error lists the columns the file really has
+        source.seek(0)
+        columns = reader(source, nrows=0).columns.tolist()
+        raise MissingColumnsError(columns, e.need) from None
+
+
+async def _analyze_upload(source: BinaryIO, filename: str, analyzer, build_table) -> dict:
+    """
+    Parse an uploaded Excel/CSV file, run a delay analyzer and attach its HTML table.
+    Results are cached by content hash, and concurrent identical uploads wait on
+    a per-key lock so the file is only analyzed once.
+    
+    Args:
+        source: Binary file object positioned at the start of the upload
+        filename: Original filename, used to pick the reader
+        analyzer: analyze_delays or analyze_delays_by_lsp
+        build_table: HTML builder matching the analyzer
+        
+    Returns:
+        Analysis result including 'html_table'
+    """
+    # Pick the reader by file type; the upload dependencies already rejected anything else
+    reader = pd.read_csv if filename.endswith('.csv') else read_excel
+    
+    key = (analyzer.__name__, reader.__name__, await asyncio.to_thread(_hash_upload, source))
+    result = _ANALYSIS_CACHE.get(key)
+    if result is not None:
+        return result
+    
+    lock = _ANALYSIS_LOCKS.setdefault(key, asyncio.Lock())
+    try:
+        async with lock:
+            # An identical upload may have finished while we waited
+            result = _ANALYSIS_CACHE.get(key)
+            if result is None:
+                result = await asyncio.to_thread(_read_and_analyze, reader, source, analyzer)
+                result["html_table"] = build_table(result)
+                _ANALYSIS_CACHE[key] = result
+    finally:
+        if not lock.locked():
+            _ANALYSIS_LOCKS.pop(key, None)
+    return result
 
 
 @app.post("/analyze-delays", response_model=DelayAnalysisResponse, response_model_exclude_none=False)
-async def analyze_delay_file(file: UploadFile = File(...)):
+async def analyze_delay_file(upload: Tuple[BinaryIO, str] = Depends(analysis_upload)):
     """
     Upload an Excel file to analyze shipment delays.
     
@@ -606,34 +662,15 @@ async def analyze_delay_file(file: UploadFile = File(...)):
     - JSON structure with delay analysis categorized by status and delay duration
     """
     try:
-        # Read the uploaded file
-        contents = await file.read()
-        
-        # Determine file type and read accordingly
-        if file.filename.endswith('.xlsx') or file.filename.endswith('.xls'):
-            df = pd.read_excel(io.BytesIO(contents))
-        elif file.filename.endswith('.csv'):
-            df = pd.read_csv(io.BytesIO(contents))
-        else:
-            raise HTTPException(
-                status_code=400,
-                detail="Unsupported file format. Please upload .xlsx, .xls, or .csv file"
-            )
-        
-        # Analyze delays using the logic from delay_analyzer.py
-        result = analyze_delays(df)
-        
-        html_table = build_html_table(result)
-        result["html_table"] = html_table
-
+        # Analyze delays using the logic from delay_analyzer.py, reusing the cached result for repeated uploads
+        result = await _analyze_upload(*upload, analyze_delays, build_html_table)
 
-# write the table HTML into file to test
-        with open("testAnalyzedTable.html", "w", encoding="utf-8") as f:
-            f.write(result["html_table"])
-
-        print(f"Resut Returned from first delay analyzation API : {result}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Result Returned from first delay analyzation API: {result}")
         return result
     
+    except HTTPException:
+        raise
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
@@ -641,7 +678,7 @@ async def analyze_delay_file(file: UploadFile = File(...)):
 
 
 @app.post("/analyze-delays-by-lsp", response_model=LSPDelayAnalysisResponse, response_model_exclude_none=False)
-async def analyze_delay_by_lsp_file(file: UploadFile = File(...)):
+async def analyze_delay_by_lsp_file(upload: Tuple[BinaryIO, str] = Depends(analysis_upload)):
     """
     Upload an Excel file to analyze shipment delays grouped by LSP company.
     
@@ -653,33 +690,15 @@ async def analyze_delay_by_lsp_file(file: UploadFile = File(...)):
     - JSON structure with delay analysis categorized by LSP company and delay duration
     """
     try:
-        # Read the uploaded file
-        contents = await file.read()
-        
-        # Determine file type and read accordingly
-        if file.filename.endswith('.xlsx') or file.filename.endswith('.xls'):
-            df = pd.read_excel(io.BytesIO(contents))
-        elif file.filename.endswith('.csv'):
-            df = pd.read_csv(io.BytesIO(contents))
-        else:
-            raise HTTPException(
-                status_code=400,
-                detail="Unsupported file format. Please upload .xlsx, .xls, or .csv file"
-            )
-        
-        # Analyze delays by LSP using the logic from delay_analyzer.py
-        result = analyze_delays_by_lsp(df)
-        
-        html_table = build_lsp_html_table(result)
-        result["html_table"] = html_table
-
-# write the table HTML into file to test
-        with open("testLSPTable.html", "w", encoding="utf-8") as f:
-            f.write(result["html_table"])
+        # Analyze delays by LSP using the logic from delay_analyzer.py, reusing the cached result for repeated uploads
+        result = await _analyze_upload(*upload, analyze_delays_by_lsp, build_lsp_html_table)
 
-        print(f"Resut Returned from LSP delay analyzation API : {result}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Result Returned from LSP delay analyzation API: {result}")
         return result
     
+    except HTTPException:
+        raise
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
@@ -688,7 +707,7 @@ async def analyze_delay_by_lsp_file(file: UploadFile = File(...)):
 
 
 @app.post("/analyze-delays-by-lsp-base64", response_model=LSPDelayAnalysisResponse, response_model_exclude_none=False)
-async def analyze_delay_by_lsp_file_base64(data: FileUploadBase64):
+async def analyze_delay_by_lsp_file_base64(upload: Tuple[BinaryIO, str] = Depends(analysis_upload_base64)):
     """
     Upload an Excel file (as base64) to analyze shipment delays grouped by LSP company.
     For Power Automate integration.
@@ -701,39 +720,15 @@ async def analyze_delay_by_lsp_file_base64(data: FileUploadBase64):
     - JSON structure with delay analysis categorized by LSP company and delay duration
     """
     try:
-        # Decode base64 to bytes
-        try:
-            file_content = base64.b64decode(data.file)
-        except Exception as e:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid base64 encoding: {str(e)}"
-            )
-        
-        # Determine file type and read accordingly
-        if data.filename.endswith('.xlsx') or data.filename.endswith('.xls'):
-            df = pd.read_excel(io.BytesIO(file_content))
-        elif data.filename.endswith('.csv'):
-            df = pd.read_csv(io.BytesIO(file_content))
-        else:
-            raise HTTPException(
-                status_code=400,
-                detail="Unsupported file format. Please upload .xlsx, .xls, or .csv file"
-            )
-        
-        # Analyze delays by LSP using the logic from delay_analyzer.py
-        result = analyze_delays_by_lsp(df)
-        
-        html_table = build_lsp_html_table(result)
-        result["html_table"] = html_table
-
-        # write the table HTML into file to test
-        with open("testLSPTable.html", "w", encoding="utf-8") as f:
-            f.write(result["html_table"])
+        # Analyze delays by LSP using the logic from delay_analyzer.py, reusing the cached result for repeated uploads
+        result = await _analyze_upload(*upload, analyze_delays_by_lsp, build_lsp_html_table)
 
-        print(f"Result Returned from LSP delay analyzation API (base64): {result}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Result Returned from LSP delay analyzation API (base64): {result}")
         return result
     
+    except HTTPException:
+        raise
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
@@ -748,13 +743,15 @@ if __name__ == "__main__":
     
     # Create necessary directories
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-    Path("temp_uploads").mkdir(exist_ok=True)
     
-    # Run the application
+    # Run the application; set RELOAD=1 for a single auto-reloading dev server
     uvicorn.run(
         "main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
+        host=SERVER_HOST,
+        port=SERVER_PORT,
+        reload=SERVER_RELOAD,
+        workers=1 if SERVER_RELOAD else SERVER_WORKERS,
+        loop=SERVER_LOOP,
+        http=SERVER_HTTP,
         log_level="info"
     )
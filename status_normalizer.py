@@ -1,11 +1,25 @@
 """
 Status normalization utilities for SafeExpress API responses
 """
+from functools import lru_cache
 
 
+# Specific status mappings, keyed by the case-folded status text
+_STATUS_MAP = {
+    "delivered": "Delivered",
+    "in-transit": "In-transit",
+    "in transit": "In-transit",
+    "lost": "LOST",
+    "out for delivery": "Out for Delivery",
+    "not found": "NOT FOUND",
+}
+
+
+@lru_cache(maxsize=64)
 def normalize_status(status: str) -> str:
     """
     Normalize status text to proper case format.
+    Cached because the API only ever returns a handful of distinct statuses.
     
     Status mappings:
     - "delivered" or "DELIVERED" -> "Delivered"
@@ -23,18 +37,5 @@ def normalize_status(status: str) -> str:
     if not status:
         return ""
     
-    # Normalize to lowercase for comparison
-    status_lower = status.lower().strip()
-    
-    # Define specific status mappings
-    status_map = {
-        "delivered": "Delivered",
-        "in-transit": "In-transit",
-        "in transit": "In-transit",
-        "lost": "LOST",
-        "out for delivery": "Out for Delivery",
-        "not found": "NOT FOUND",
-    }
-    
     # Return mapped status if found, otherwise use title case
-    return status_map.get(status_lower, status.title())
+    return _STATUS_MAP.get(status.casefold().strip(), status.title())
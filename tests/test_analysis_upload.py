@@ -0,0 +1,41 @@
+"""
+Tests for reading analysis uploads and reporting missing columns
+"""
+import io
+import unittest
+
+import pandas as pd
+
+from delay_analyzer import MissingColumnsError, analyze_delays, analyze_delays_by_lsp
+from main import _read_and_analyze
+
+
+class ReadAndAnalyzeMissingColumnsTest(unittest.TestCase):
+    """The missing-columns error must list the file's real headers, not just the usecols subset"""
+
+    def assert_found_columns(self, csv: bytes, analyzer, expected: list):
+        with self.assertRaises(MissingColumnsError) as ctx:
+            _read_and_analyze(pd.read_csv, io.BytesIO(csv), analyzer)
+        self.assertIn(f"Found columns: {expected}.", str(ctx.exception))
+
+    def test_partial_match_lists_all_headers(self):
+        self.assert_found_columns(b"Current Status,Foo\nDelivered,1\n", analyze_delays, ['Current Status', 'Foo'])
+
+    def test_partial_match_lists_all_headers_for_lsp(self):
+        self.assert_found_columns(b"Current Status,Foo\nDelivered,1\n", analyze_delays_by_lsp, ['Current Status', 'Foo'])
+
+    def test_no_match_lists_all_headers(self):
+        self.assert_found_columns(b"Foo,Bar\n1,2\n", analyze_delays, ['Foo', 'Bar'])
+
+    def test_missing_columns_is_still_a_value_error(self):
+        # The endpoints map ValueError to HTTP 400
+        self.assertTrue(issubclass(MissingColumnsError, ValueError))
+
+    def test_matching_upload_is_analyzed(self):
+        csv = b"Current Status,Delay by Days,Foo\nDelivered,2,x\nIn-transit,7,y\n"
+        result = _read_and_analyze(pd.read_csv, io.BytesIO(csv), analyze_delays)
+        self.assertEqual(result['totals']['grand_total'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
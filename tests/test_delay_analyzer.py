@@ -0,0 +1,64 @@
+"""
+Tests for the status and LSP row labels produced by the delay analyzers
+"""
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from delay_analyzer import PREDEFINED_STATUSES, analyze_delays, analyze_delays_by_lsp
+
+
+def baseline_status_order(values: list) -> list:
+    """Row order of the original implementation: predefined statuses, then sorted extras"""
+    extras = set(pd.Series(values).dropna().unique()) - set(PREDEFINED_STATUSES)
+    return PREDEFINED_STATUSES + sorted(extras)
+
+
+class StatusRowsTest(unittest.TestCase):
+    """analyze_delays rows must keep the baseline labels and order"""
+
+    def rows(self, statuses: list, delays: list) -> list:
+        df = pd.DataFrame({'Current Status': statuses, 'Delay by Days': delays})
+        return [(row['status'], row['grand_total']) for row in analyze_delays(df)['data']]
+
+    def test_string_statuses_with_nan_match_baseline(self):
+        statuses = ['Zeta', 'LOST', np.nan, 'Alpha', None, 'Delivered', 'Alpha']
+        rows = self.rows(statuses, [1, 2, 3, 5, 1, 0, 4])
+        self.assertEqual([status for status, _ in rows], baseline_status_order(statuses))
+        counts = dict(rows)
+        self.assertEqual(counts['Alpha'], 2)
+        self.assertEqual(counts['LOST'], 1)
+        self.assertEqual(counts['Zeta'], 1)
+        self.assertEqual(counts['Delivered'], 0)
+
+    def test_non_string_statuses_are_stringified(self):
+        # The baseline raised TypeError sorting mixed int/str keys; values are now labelled as strings
+        rows = self.rows(['Zeta', 12, '12', 7, np.nan, 'LOST'], [1, 1, 9, 2, 3, 2])
+        self.assertEqual(
+            rows[len(PREDEFINED_STATUSES):],
+            [('12', 2), ('7', 1), ('Zeta', 1)],
+        )
+        self.assertEqual(dict(rows)['LOST'], 1)
+
+
+class LspRowsTest(unittest.TestCase):
+    """analyze_delays_by_lsp rows must keep the baseline labels and order"""
+
+    def rows(self, lsps: list, delays: list) -> list:
+        df = pd.DataFrame({'LSPName': lsps, 'Delay by Days': delays})
+        return [(row['lsp_name'], row['grand_total']) for row in analyze_delays_by_lsp(df)['data']]
+
+    def test_string_lsps_with_nan_match_baseline(self):
+        lsps = ['Blue Dart', np.nan, 'Delhivery', 'Blue Dart', None, 'Amazon']
+        rows = self.rows(lsps, [1, 2, 3, 5, 1, 0])
+        self.assertEqual([lsp for lsp, _ in rows], sorted(pd.Series(lsps).dropna().unique()))
+        self.assertEqual(rows, [('Amazon', 0), ('Blue Dart', 2), ('Delhivery', 1)])
+
+    def test_non_string_lsps_are_stringified(self):
+        rows = self.rows(['B', np.nan, 'A', 3, '3', 'A', 10], [1, 2, 3, 5, 1, 9, 2])
+        self.assertEqual(rows, [('10', 1), ('3', 2), ('A', 2), ('B', 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
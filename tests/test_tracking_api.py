@@ -0,0 +1,82 @@
+"""
+Tests for tracking_api response handling against a local fake API
+"""
+import collections
+import unittest
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import tracking_api
+
+
+class FetchTrackingStatusTest(unittest.IsolatedAsyncioTestCase):
+    """fetch_tracking_status against a local server whose reply is chosen per test"""
+
+    async def asyncSetUp(self):
+        self.replies = []
+        self.hits = collections.Counter()
+        app = web.Application()
+        app.router.add_post('/track', self.handle)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.patch('TRACKING_API_URL', str(self.server.make_url('/track')))
+        self.patch('RETRY_DELAY', 0.001)
+        self.session = tracking_api.get_session()
+
+    async def asyncTearDown(self):
+        await tracking_api.close_session()
+        await self.server.close()
+
+    def patch(self, name, value):
+        original = getattr(tracking_api, name)
+        setattr(tracking_api, name, value)
+        self.addCleanup(setattr, tracking_api, name, original)
+
+    async def handle(self, request):
+        lr_number = (await request.json())['docNo'][0]
+        self.hits[lr_number] += 1
+        # Replies are factories (a response can only be sent once); the last one repeats
+        reply = self.replies.pop(0) if len(self.replies) > 1 else self.replies[0]
+        return reply(lr_number)
+
+    @staticmethod
+    def empty(status):
+        return lambda lr_number: web.Response(status=status, content_type='application/json')
+
+    @staticmethod
+    def delivered(lr_number):
+        return web.json_response({
+            "status": "Ok",
+            "data": {"tracking": [{"docNo": lr_number, "status": [
+                {"status": "DELIVERED", "trackDate": "2026-10-01 10:00:00", "mode": "ROAD"}
+            ]}]}
+        })
+
+    async def test_empty_204_is_not_found_without_retry(self):
+        self.replies = [self.empty(204)]
+        result = await tracking_api.fetch_tracking_status(self.session, '500000000001')
+        self.assertEqual(result.status, 'NOT FOUND')
+        self.assertEqual(self.hits['500000000001'], 1)
+
+    async def test_empty_200_is_retried(self):
+        self.replies = [self.empty(200), self.delivered]
+        result = await tracking_api.fetch_tracking_status(self.session, '500000000002')
+        self.assertEqual(result.status, 'Delivered')
+        self.assertEqual(self.hits['500000000002'], 2)
+
+    async def test_empty_200_exhausts_retries_as_error(self):
+        self.replies = [self.empty(200)]
+        result = await tracking_api.fetch_tracking_status(self.session, '500000000003')
+        self.assertEqual(result.status, 'ERROR')
+        self.assertEqual(self.hits['500000000003'], tracking_api.MAX_RETRIES + 1)
+
+    async def test_unrecoverable_status_is_not_retried(self):
+        self.replies = [self.empty(404)]
+        result = await tracking_api.fetch_tracking_status(self.session, '500000000004')
+        self.assertEqual((result.status, result.error), ('ERROR', 'HTTP 404'))
+        self.assertEqual(self.hits['500000000004'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
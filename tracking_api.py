@@ -4,9 +4,13 @@ Calls the tracking API and parses status responses
 """
 import asyncio
 import aiohttp
-import json
 import logging
-from typing import Dict, Optional
+import random
+import orjson
+from dataclasses import dataclass
+from functools import lru_cache
+from cachetools import TLRUCache
+from typing import Awaitable, Callable, Dict, List, Optional
 from datetime import datetime, timedelta
 
 from config import (
@@ -14,150 +18,457 @@ from config import (
     TRACKING_API_TIMEOUT, 
     TRACKING_API_TOKEN,
     TRACKING_USER_AGENT,
+    TRACKING_CONNECTION_LIMIT,
+    TRACKING_CONNECTION_LIMIT_PER_HOST,
+    TRACKING_KEEPALIVE_TIMEOUT,
+    TRACKING_DNS_CACHE_TTL,
+    TRACKING_DOCS_PER_REQUEST,
+    TRACKING_CACHE_SIZE,
+    TRACKING_TERMINAL_CACHE_TTL,
+    TRACKING_ACTIVE_CACHE_TTL,
+    TRACKING_PARSE_OFFLOAD_BYTES,
     LOST_THRESHOLD_DAYS,
     MAX_RETRIES,
     RETRY_DELAY,
-    RETRY_BACKOFF_FACTOR
+    RETRY_BACKOFF_FACTOR,
+    MAX_RETRY_DELAY
 )
 from status_normalizer import normalize_status
 
 logger = logging.getLogger(__name__)
 
+# Static request headers, sent as the shared session's defaults
+_HEADERS = {
+    'accept': 'application/json, text/plain, */*',
+    'accept-language': 'en-GB,en-US;q=0.9,en;q=0.8,es;q=0.7',
+    'content-type': 'application/json',
+    'origin': 'https://www.safexpress.com',
+    'referer': 'https://www.safexpress.com/',
+    'token': TRACKING_API_TOKEN,
+    'user-agent': TRACKING_USER_AGENT,
+    'sec-ch-ua': '"Google Chrome";v="143", "Chromium";v="143", "Not A(Brand";v="24"',
+    'sec-ch-ua-mobile': '?0',
+    'sec-ch-ua-platform': '"Windows"',
+    'sec-fetch-dest': 'empty',
+    'sec-fetch-mode': 'cors',
+    'sec-fetch-site': 'same-site'
+}
 
-async def fetch_tracking_status(session: aiohttp.ClientSession, lr_number: str, retry_count: int = 0) -> Dict:
+# Document type sent with every tracking request (waybill)
+_DOC_TYPE = "WB"
+
+# Statuses that will not change any more are cached for much longer than in-flight ones.
+# NOT FOUND is left out: it is also returned for transient non-OK API payloads
+TERMINAL_STATUSES = frozenset({"Delivered", "LOST"})
+
+
+@dataclass(slots=True, frozen=True)
+class TrackingResult:
+    """Tracking outcome for one LR number"""
+    lr_number: str
+    status: str
+    error: Optional[str] = None
+    track_date: str = ""
+    mode: str = ""
+
+
+def _result_expiry(lr_number: str, result: TrackingResult, now: float) -> float:
+    """Expiry time for a cached tracking result, based on whether its status is final"""
+    ttl = TRACKING_TERMINAL_CACHE_TTL if result.status in TERMINAL_STATUSES else TRACKING_ACTIVE_CACHE_TTL
+    return now + ttl
+
+
+# Recent tracking results keyed by LR number
+_RESULT_CACHE = TLRUCache(maxsize=TRACKING_CACHE_SIZE, ttu=_result_expiry)
+
+# One pooled session per event loop so batches reuse warm TCP/TLS connections
+_session: Optional[aiohttp.ClientSession] = None
+_session_loop: Optional[asyncio.AbstractEventLoop] = None
+# Close tasks for replaced sessions, referenced until they finish
+_closing_tasks = set()
+
+
+def _retire_session(session: aiohttp.ClientSession, loop: asyncio.AbstractEventLoop) -> None:
+    """
+    Close a pooled session that was opened on a different event loop
+    
+    Args:
+        session: Session being replaced
+        loop: Event loop the session was created on
+    """
+    if loop.is_closed():
+        # Nothing can run on a finished loop; closing from the current one still
+        # shuts the connector and drops its pooled connections
+        task = asyncio.get_running_loop().create_task(session.close())
+        _closing_tasks.add(task)
+        task.add_done_callback(_closing_tasks.discard)
+    else:
+        # The owning loop is still alive (e.g. in another thread), so close it there
+        asyncio.run_coroutine_threadsafe(session.close(), loop)
+
+
+def get_session() -> aiohttp.ClientSession:
+    """
+    Return the shared tracking session, creating it on first use
+    (or when the previous one was closed or belongs to another event loop).
+    Must be called from a running event loop.
+    
+    Returns:
+        Shared aiohttp session with keep-alive connection pooling
+    """
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        if _session is not None and not _session.closed:
+            _retire_session(_session, _session_loop)
+        # aiohttp resolves through aiodns (AsyncResolver) when it is installed and
+        # getaddrinfo in a thread otherwise; either way lookups are cached for ttl_dns_cache
+        connector = aiohttp.TCPConnector(
+            limit=TRACKING_CONNECTION_LIMIT,
+            limit_per_host=TRACKING_CONNECTION_LIMIT_PER_HOST,
+            keepalive_timeout=TRACKING_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=TRACKING_DNS_CACHE_TTL
+        )
+        # Compression is negotiated by aiohttp's default accept-encoding (br once Brotli is installed);
+        # the API authenticates by token, so cookies are never stored
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            headers=_HEADERS,
+            cookie_jar=aiohttp.DummyCookieJar(),
+            timeout=aiohttp.ClientTimeout(total=TRACKING_API_TIMEOUT)
+        )
+        _session_loop = loop
+    return _session
+
+
+async def close_session() -> None:
+    """Close the shared tracking session, if one is open (call on app shutdown)"""
+    global _session, _session_loop
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+    _session_loop = None
+
+
+# Timeouts, rate limiting and temporary server failures are worth retrying;
+# any other error status (bad token, bad body, unknown route) will not recover
+_RECOVERABLE_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+
+def _is_recoverable(exc: aiohttp.ClientError) -> bool:
+    """
+    Decide whether a client error can succeed on retry
+    
+    Args:
+        exc: Error raised by the request
+        
+    Returns:
+        False for malformed URLs and non-recoverable response statuses, True otherwise
+    """
+    if isinstance(exc, aiohttp.InvalidURL):
+        return False
+    if isinstance(exc, aiohttp.ClientResponseError):
+        return exc.status in _RECOVERABLE_STATUSES
+    # Connection failures, dropped connections and payload errors are transient
+    return True
+
+
+def _compute_backoff(retry_count: int) -> float:
+    """
+    Exponential backoff capped at MAX_RETRY_DELAY, with +/-50% jitter so
+    concurrent LRs that failed together do not all retry at the same instant
+    
+    Args:
+        retry_count: Number of retries already made
+        
+    Returns:
+        Delay in seconds before the next attempt
+    """
+    delay = min(MAX_RETRY_DELAY, RETRY_DELAY * (RETRY_BACKOFF_FACTOR ** retry_count))
+    return delay * random.uniform(0.5, 1.5)
+
+
+def _retry_after(response: aiohttp.ClientResponse) -> Optional[float]:
+    """
+    Read the Retry-After header of a throttled response
+    
+    Args:
+        response: aiohttp response
+        
+    Returns:
+        Delay in seconds (capped at MAX_RETRY_DELAY), or None if absent or not numeric
+    """
+    value = response.headers.get("Retry-After", "").strip()
+    if not value.isdigit():
+        return None
+    return min(float(value), MAX_RETRY_DELAY)
+
+
+async def _loads(buf: bytes):
+    """
+    Decode a JSON response body, moving large bodies off the event loop
+    
+    Args:
+        buf: Raw response bytes
+        
+    Returns:
+        Decoded JSON data
+    """
+    if len(buf) > TRACKING_PARSE_OFFLOAD_BYTES:
+        # Keep the loop serving other sockets while a big multi-document payload is decoded
+        return await asyncio.to_thread(orjson.loads, buf)
+    return orjson.loads(buf)
+
+
+def _preview(buf: bytes, limit: int) -> str:
+    """Decode the start of a response body for logging"""
+    return buf[:limit].decode('utf-8', 'replace')
+
+
+async def fetch_tracking_status(
+    session: aiohttp.ClientSession,
+    lr_number: str,
+    now: Optional[datetime] = None
+) -> TrackingResult:
     """
     Fetch tracking status for a single LR number from API
     
     Args:
         session: aiohttp session
         lr_number: LR number to track
+        now: Reference time for the LOST check (defaults to the current time)
         
     Returns:
-        Dictionary with status information
+        TrackingResult with status information
     """
-    try:
-        # Prepare headers
-        headers = {
-            'accept': 'application/json, text/plain, */*',
-            'accept-language': 'en-GB,en-US;q=0.9,en;q=0.8,es;q=0.7',
-            'content-type': 'application/json',
-            'origin': 'https://www.safexpress.com',
-            'referer': 'https://www.safexpress.com/',
-            'token': TRACKING_API_TOKEN,
-            'user-agent': TRACKING_USER_AGENT,
-            'sec-ch-ua': '"Google Chrome";v="143", "Chromium";v="143", "Not A(Brand";v="24"',
-            'sec-ch-ua-mobile': '?0',
-            'sec-ch-ua-platform': '"Windows"',
-            'sec-fetch-dest': 'empty',
-            'sec-fetch-mode': 'cors',
-            'sec-fetch-site': 'same-site'
-        }
+    # Serialized once with orjson; the session headers already carry content-type: application/json
+    body = orjson.dumps({"docNo": [lr_number], "docType": _DOC_TYPE})
+    
+    for attempt in range(MAX_RETRIES + 1):
+        can_retry = attempt < MAX_RETRIES
+        # Reset per attempt so error logs never show an earlier attempt's body
+        buf = b""
+        try:
+            # Make API call (headers and timeout come from the session defaults)
+            async with session.post(TRACKING_API_URL, data=body) as response:
+                if 200 <= response.status < 300:
+                    try:
+                        # Read raw bytes first to capture content on error
+                        buf = await response.read()
+                        
+                        # Check if response is empty
+                        if not buf or not buf.strip():
+                            if response.status != 200:
+                                # 204 / empty 201..299: the API answered that it has nothing, retrying will not change that
+                                logger.warning(f"Empty HTTP {response.status} response for LR {lr_number}")
+                                return _not_found(lr_number, f"Empty HTTP {response.status} response")
+                            # An empty 200 is how the API sheds load, so it goes through the retry path
+                            raise ValueError("Empty response from API")
+                        
+                        # Check content type
+                        if response.content_type and 'json' not in response.content_type.lower():
+                            logger.warning(f"Unexpected content-type for LR {lr_number}: {response.content_type}")
+                        
+                        # Parse JSON straight from the bytes, no intermediate str
+                        data = await _loads(buf)
+                        
+                        return parse_tracking_response(data, lr_number, now)
+                    except ValueError as e:
+                        # Retry on JSON parse errors, incl. orjson.JSONDecodeError (often caused by empty responses from rate limiting)
+                        if not can_retry:
+                            logger.error(f"Failed to parse JSON for LR {lr_number} after {MAX_RETRIES} retries: {e}")
+                            # Only decode the body preview when the lines will actually be emitted
+                            if logger.isEnabledFor(logging.ERROR):
+                                logger.error(f"Response text (first 1000 chars): {_preview(buf, 1000) if buf else 'N/A'}")
+                                logger.error(f"Content-Type: {response.content_type}")
+                            logger.error(f"Full exception: {type(e).__name__}: {str(e)}", exc_info=True)
+                            return TrackingResult(
+                                lr_number=lr_number,
+                                status="ERROR",
+                                error=f"JSON parse error after retries: {type(e).__name__}"
+                            )
+                        delay = _compute_backoff(attempt)
+                        logger.warning(f"JSON parse error for LR {lr_number}: {type(e).__name__}, retrying in {delay:.2f}s (attempt {attempt + 1}/{MAX_RETRIES})")
+                        if logger.isEnabledFor(logging.WARNING):
+                            logger.warning(f"Response text (first 200 chars): {_preview(buf, 200) if buf else 'N/A'}")
+                    except Exception as e:
+                        logger.error(f"Unexpected error parsing response for LR {lr_number}: {type(e).__name__} - {str(e)}", exc_info=True)
+                        return TrackingResult(
+                            lr_number=lr_number,
+                            status="ERROR",
+                            error=f"Parse error: {type(e).__name__} - {str(e)}"
+                        )
+                elif response.status in _RECOVERABLE_STATUSES and can_retry:
+                    # Error bodies are never read, hand the connection back to the pool right away
+                    response.release()
+                    delay = _retry_after(response)
+                    if delay is None:
+                        delay = _compute_backoff(attempt)
+                    logger.warning(f"HTTP {response.status} for LR {lr_number}, retrying in {delay:.2f}s (attempt {attempt + 1}/{MAX_RETRIES})")
+                else:
+                    response.release()
+                    logger.error(f"API error for LR {lr_number}: HTTP {response.status}")
+                    return TrackingResult(
+                        lr_number=lr_number,
+                        status="ERROR",
+                        error=f"HTTP {response.status}"
+                    )
+        except asyncio.TimeoutError:
+            if not can_retry:
+                logger.error(f"Timeout for LR {lr_number} after {MAX_RETRIES} retries (timeout: {TRACKING_API_TIMEOUT}s)")
+                return TrackingResult(
+                    lr_number=lr_number,
+                    status="ERROR",
+                    error="API Timeout (after retries)"
+                )
+            delay = _compute_backoff(attempt)
+            logger.warning(f"Timeout for LR {lr_number}, retrying in {delay:.2f}s (attempt {attempt + 1}/{MAX_RETRIES})")
+        except aiohttp.ClientError as e:
+            if not _is_recoverable(e):
+                logger.error(f"HTTP client error for LR {lr_number}: {type(e).__name__} - {str(e)}")
+                return TrackingResult(
+                    lr_number=lr_number,
+                    status="ERROR",
+                    error=f"HTTP Error: {type(e).__name__}"
+                )
+            if not can_retry:
+                logger.error(f"HTTP client error for LR {lr_number} after {MAX_RETRIES} retries: {type(e).__name__} - {str(e)}")
+                return TrackingResult(
+                    lr_number=lr_number,
+                    status="ERROR",
+                    error=f"HTTP Error: {type(e).__name__} (after retries)"
+                )
+            delay = _compute_backoff(attempt)
+            logger.warning(f"HTTP client error for LR {lr_number}: {type(e).__name__}, retrying in {delay:.2f}s (attempt {attempt + 1}/{MAX_RETRIES})")
+        except Exception as e:
+            logger.error(f"Unexpected error fetching status for LR {lr_number}: {type(e).__name__} - {str(e)}", exc_info=True)
+            return TrackingResult(
+                lr_number=lr_number,
+                status="ERROR",
+                error=f"{type(e).__name__}: {str(e)}"
+            )
+        
+        # Back off outside the response context so the connection is already released
+        await asyncio.sleep(delay)
+
+
+async def fetch_tracking_batch(
+    session: aiohttp.ClientSession,
+    lr_numbers: List[str],
+    now: Optional[datetime] = None
+) -> Dict[str, TrackingResult]:
+    """
+    Fetch tracking statuses for several LR numbers with one request.
+    Transient failures (timeouts, connection errors, recoverable HTTP statuses) retry the
+    whole batch with backoff. Only LRs the batch cannot answer at the payload level
+    (rejected request, unexpected payload, entry missing) are fetched individually.
+    
+    Args:
+        session: aiohttp session
+        lr_numbers: LR numbers to send together in the docNo list
+        now: Reference time for the LOST check (defaults to the current time)
         
-        # Prepare body in the correct format
-        body = {
-            "docNo": [lr_number],
-            "docType": "WB"
-        }
+    Returns:
+        Dictionary mapping LR numbers to their status
+    """
+    if len(lr_numbers) == 1:
+        return {lr_numbers[0]: await fetch_tracking_status(session, lr_numbers[0], now=now)}
+    
+    body = orjson.dumps({"docNo": list(lr_numbers), "docType": _DOC_TYPE})
+    results = {}
+    
+    for attempt in range(MAX_RETRIES + 1):
+        can_retry = attempt < MAX_RETRIES
+        error = None
+        try:
+            async with session.post(TRACKING_API_URL, data=body) as response:
+                if 200 <= response.status < 300:
+                    data = await _loads(await response.read())
+                    if isinstance(data, dict) and data.get("status") == "Ok":
+                        # Entries are matched back to their LR through the docNo field
+                        wanted = set(lr_numbers)
+                        for tracking in (data.get("data") or {}).get("tracking") or []:
+                            doc_no = str(tracking.get("docNo", ""))
+                            if doc_no in wanted and doc_no not in results:
+                                results[doc_no] = parse_tracking_entry(tracking, doc_no, now)
+                    break
+                response.release()
+                if response.status not in _RECOVERABLE_STATUSES:
+                    # The API may not accept this multi-document request; try the LRs one by one
+                    logger.warning(f"Batch tracking request for {len(lr_numbers)} LRs returned HTTP {response.status}")
+                    break
+                error = f"HTTP {response.status}"
+                delay = _retry_after(response)
+        except ValueError as e:
+            # Empty or malformed body: a payload-level failure, handled by the single-LR fallback
+            logger.warning(f"Batch tracking response for {len(lr_numbers)} LRs could not be parsed: {type(e).__name__} - {str(e)}")
+            break
+        except asyncio.TimeoutError:
+            error = "API Timeout (after retries)"
+            delay = None
+        except aiohttp.ClientError as e:
+            error = f"HTTP Error: {type(e).__name__}"
+            delay = None
+            if not _is_recoverable(e):
+                can_retry = False
         
-        # Make API call
-        async with session.post(
-            TRACKING_API_URL,
-            json=body,
-            headers=headers,
-            timeout=aiohttp.ClientTimeout(total=TRACKING_API_TIMEOUT)
-        ) as response:
-            if response.status == 200:
-                try:
-                    # Read response text first to capture content on error
-                    text = await response.text()
-                    
-                    # Check if response is empty
-                    if not text or not text.strip():
-                        raise ValueError("Empty response from API")
-                    
-                    # Check content type
-                    if response.content_type and 'json' not in response.content_type.lower():
-                        logger.warning(f"Unexpected content-type for LR {lr_number}: {response.content_type}")
-                    
-                    # Parse text as JSON
-                    data = json.loads(text)
-                    
-                    return parse_tracking_response(data, lr_number)
-                except (json.JSONDecodeError, ValueError) as e:
-                    # Retry on JSON parse errors (often caused by empty responses from rate limiting)
-                    if retry_count < MAX_RETRIES:
-                        delay = RETRY_DELAY * (RETRY_BACKOFF_FACTOR ** retry_count)
-                        logger.warning(f"JSON parse error for LR {lr_number}: {type(e).__name__}, retrying in {delay}s (attempt {retry_count + 1}/{MAX_RETRIES})")
-                        logger.warning(f"Response text (first 200 chars): {text[:200] if 'text' in locals() else 'N/A'}")
-                        await asyncio.sleep(delay)
-                        return await fetch_tracking_status(session, lr_number, retry_count + 1)
-                    # After all retries exhausted
-                    logger.error(f"Failed to parse JSON for LR {lr_number} after {MAX_RETRIES} retries: {e}")
-                    logger.error(f"Response text (first 1000 chars): {text[:1000] if 'text' in locals() else 'N/A'}")
-                    logger.error(f"Content-Type: {response.content_type}")
-                    logger.error(f"Full exception: {type(e).__name__}: {str(e)}", exc_info=True)
-                    return {
-                        "lr_number": lr_number,
-                        "status": "ERROR",
-                        "error": f"JSON parse error after retries: {type(e).__name__}"
-                    }
-                except Exception as e:
-                    logger.error(f"Unexpected error parsing response for LR {lr_number}: {type(e).__name__} - {str(e)}", exc_info=True)
-                    return {
-                        "lr_number": lr_number,
-                        "status": "ERROR",
-                        "error": f"Parse error: {type(e).__name__} - {str(e)}"
-                    }
-            else:
-                logger.error(f"API error for LR {lr_number}: HTTP {response.status}")
-                return {
-                    "lr_number": lr_number,
-                    "status": "ERROR",
-                    "error": f"HTTP {response.status}"
-                }
-    except asyncio.TimeoutError:
-        if retry_count < MAX_RETRIES:
-            delay = RETRY_DELAY * (RETRY_BACKOFF_FACTOR ** retry_count)
-            logger.warning(f"Timeout for LR {lr_number}, retrying in {delay}s (attempt {retry_count + 1}/{MAX_RETRIES})")
-            await asyncio.sleep(delay)
-            return await fetch_tracking_status(session, lr_number, retry_count + 1)
-        logger.error(f"Timeout for LR {lr_number} after {MAX_RETRIES} retries (timeout: {TRACKING_API_TIMEOUT}s)")
-        return {
-            "lr_number": lr_number,
-            "status": "ERROR",
-            "error": "API Timeout (after retries)"
-        }
-    except aiohttp.ClientError as e:
-        if retry_count < MAX_RETRIES:
-            delay = RETRY_DELAY * (RETRY_BACKOFF_FACTOR ** retry_count)
-            logger.warning(f"HTTP client error for LR {lr_number}: {type(e).__name__}, retrying in {delay}s (attempt {retry_count + 1}/{MAX_RETRIES})")
-            await asyncio.sleep(delay)
-            return await fetch_tracking_status(session, lr_number, retry_count + 1)
-        logger.error(f"HTTP client error for LR {lr_number} after {MAX_RETRIES} retries: {type(e).__name__} - {str(e)}")
-        return {
-            "lr_number": lr_number,
-            "status": "ERROR",
-            "error": f"HTTP Error: {type(e).__name__} (after retries)"
-        }
-    except Exception as e:
-        logger.error(f"Unexpected error fetching status for LR {lr_number}: {type(e).__name__} - {str(e)}", exc_info=True)
-        return {
-            "lr_number": lr_number,
-            "status": "ERROR",
-            "error": f"{type(e).__name__}: {str(e)}"
-        }
+        if not can_retry:
+            # Retrying each LR on its own would only multiply the load on a failing API
+            logger.error(f"Batch tracking request for {len(lr_numbers)} LRs failed after {attempt} retries: {error}")
+            return {
+                lr_number: TrackingResult(lr_number=lr_number, status="ERROR", error=error)
+                for lr_number in lr_numbers
+            }
+        if delay is None:
+            delay = _compute_backoff(attempt)
+        logger.warning(f"Batch tracking request for {len(lr_numbers)} LRs failed ({error}), retrying in {delay:.2f}s (attempt {attempt + 1}/{MAX_RETRIES})")
+        # Back off outside the response context so the connection is already released
+        await asyncio.sleep(delay)
+    
+    # Fall back to single-LR requests for anything the batch did not answer
+    missing = [lr for lr in lr_numbers if lr not in results]
+    if missing:
+        logger.info(f"Tracking {len(missing)} of {len(lr_numbers)} LRs individually after batch request")
+    for lr_number in missing:
+        results[lr_number] = await fetch_tracking_status(session, lr_number, now=now)
+    return results
 
 
-def parse_tracking_response(data: Dict, lr_number: str) -> Dict:
+@lru_cache(maxsize=1)
+def _lost_cutoff(now: datetime) -> datetime:
+    """
+    Latest track date that counts as LOST at the given reference time.
+    Cached so a batch sharing one reference time computes it only once.
+    
+    Args:
+        now: Reference time for the LOST check
+        
+    Returns:
+        Track dates at or before this moment are more than LOST_THRESHOLD_DAYS whole days old
+    """
+    return now - timedelta(days=LOST_THRESHOLD_DAYS + 1)
+
+
+def _not_found(lr_number: str, error: str) -> TrackingResult:
+    """Build the NOT FOUND result for an LR the API has no usable data for"""
+    return TrackingResult(
+        lr_number=lr_number,
+        status="NOT FOUND",
+        error=error
+    )
+
+
+def parse_tracking_response(data: Dict, lr_number: str, now: Optional[datetime] = None) -> TrackingResult:
     """
     Parse the tracking API response and determine final status
     
     Args:
         data: API response JSON
         lr_number: LR number
+        now: Reference time for the LOST check (defaults to the current time)
         
     Returns:
-        Dictionary with parsed status
+        TrackingResult with parsed status
     """
     try:
         logger.info(f"Parsing response for LR {lr_number}: {data}")
@@ -165,108 +476,184 @@ def parse_tracking_response(data: Dict, lr_number: str) -> Dict:
         if data.get("status") != "Ok":
             error_msg = data.get("message", "Invalid API response")
             logger.error(f"API returned non-OK status for LR {lr_number}: {error_msg}")
-            return {
-                "lr_number": lr_number,
-                "status": "NOT FOUND",
-                "error": error_msg
-            }
+            return _not_found(lr_number, error_msg)
         
-        tracking_data = data.get("data", {}).get("tracking", [])
-        if not tracking_data:
+        # The schema is fixed, so index straight into the first tracking entry
+        try:
+            tracking = data["data"]["tracking"][0]
+        except (KeyError, IndexError, TypeError):
             logger.warning(f"No tracking data for LR {lr_number}")
-            return {
-                "lr_number": lr_number,
-                "status": "NOT FOUND",
-                "error": "No tracking data"
-            }
+            return _not_found(lr_number, "No tracking data")
         
-        # Get the first tracking entry
-        tracking = tracking_data[0]
-        statuses = tracking.get("status", [])
+        return parse_tracking_entry(tracking, lr_number, now)
         
-        if not statuses:
-            logger.warning(f"No status information for LR {lr_number}")
-            return {
-                "lr_number": lr_number,
-                "status": "NOT FOUND",
-                "error": "No status information"
-            }
+    except Exception as e:
+        logger.error(f"Error parsing response for LR {lr_number}: {e}", exc_info=True)
+        return TrackingResult(
+            lr_number=lr_number,
+            status="ERROR",
+            error=f"Parse error: {str(e)}"
+        )
+
+
+def parse_tracking_entry(tracking: Dict, lr_number: str, now: Optional[datetime] = None) -> TrackingResult:
+    """
+    Determine the final status from a single tracking entry
+    
+    Args:
+        tracking: One item of the response's data.tracking list
+        lr_number: LR number
+        now: Reference time for the LOST check (defaults to the current time)
         
+    Returns:
+        TrackingResult with parsed status
+    """
+    try:
         # Get the latest status (last item in the list)
-        latest_status = statuses[-1]
-        status_text = normalize_status(latest_status.get("status", ""))
+        try:
+            latest_status = tracking["status"][-1]
+            status_text = normalize_status(latest_status["status"])
+        except (KeyError, IndexError, TypeError):
+            logger.warning(f"No status information for LR {lr_number}")
+            return _not_found(lr_number, "No status information")
         track_date_str = latest_status.get("trackDate", "")
         
         logger.info(f"LR {lr_number}: Latest status = {status_text}, Date = {track_date_str}")
         
-        # Parse date
+        # Parse date ("YYYY-MM-DD HH:MM:SS"); fromisoformat is C-level and much faster than strptime
         track_date = None
         if track_date_str:
             try:
-                track_date = datetime.strptime(track_date_str, "%Y-%m-%d %H:%M:%S")
-            except Exception as e:
+                track_date = datetime.fromisoformat(track_date_str)
+            except (ValueError, TypeError) as e:
                 logger.warning(f"Could not parse date '{track_date_str}' for LR {lr_number}: {e}")
         
         # Check if In-transit for too long (mark as LOST)
         if status_text == "In-transit" and track_date:
-            days_in_transit = (datetime.now() - track_date).days
-            if days_in_transit > LOST_THRESHOLD_DAYS:
-                logger.info(f"LR {lr_number}: In-transit for {days_in_transit} days, marking as LOST")
+            if track_date <= _lost_cutoff(now or datetime.now()):
+                logger.info(f"LR {lr_number}: In-transit for more than {LOST_THRESHOLD_DAYS} days, marking as LOST")
                 status_text = "LOST"
         
-        return {
-            "lr_number": lr_number,
-            "status": status_text,
-            "track_date": track_date_str,
-            "mode": latest_status.get("mode", ""),
-            "error": None
-        }
+        return TrackingResult(
+            lr_number=lr_number,
+            status=status_text,
+            track_date=track_date_str,
+            mode=latest_status.get("mode", ""),
+            error=None
+        )
         
     except Exception as e:
         logger.error(f"Error parsing response for LR {lr_number}: {e}", exc_info=True)
-        return {
-            "lr_number": lr_number,
-            "status": "ERROR",
-            "error": f"Parse error: {str(e)}"
-        }
+        return TrackingResult(
+            lr_number=lr_number,
+            status="ERROR",
+            error=f"Parse error: {str(e)}"
+        )
+
+
+async def track_multiple_lr_numbers_stream(
+    lr_numbers: list,
+    writer: Callable[[str, TrackingResult], Awaitable[None]],
+    max_concurrent: int = 10,
+    session: Optional[aiohttp.ClientSession] = None,
+    force_refresh: bool = False
+) -> None:
+    """
+    Track multiple LR numbers in parallel, handing each status to a writer as soon as it arrives.
+    Nothing is accumulated here, so very large batches can be spilled to disk
+    (e.g. a CSV file or a database table written in batches) instead of held in memory.
+    
+    Args:
+        lr_numbers: List of LR numbers to track
+        writer: Async callback awaited as writer(lr_number, result) for every LR
+        max_concurrent: Maximum concurrent API calls
+        session: Session to use; defaults to the shared pooled session
+        force_refresh: Ignore cached statuses and query the API for every LR
+    """
+    # Skip the API for LRs whose status is still cached
+    if not force_refresh:
+        pending = []
+        served = 0
+        for lr_num in lr_numbers:
+            cached = _RESULT_CACHE.get(lr_num)
+            if cached is not None:
+                await writer(lr_num, cached)
+                served += 1
+            else:
+                pending.append(lr_num)
+        if served:
+            logger.info(f"Served {served} of {len(lr_numbers)} LR statuses from cache")
+        lr_numbers = pending
+    
+    # One reference time for the whole run instead of a clock call per LR
+    now = datetime.now()
+    
+    # Reuse the pooled session so warm connections carry over between calls
+    if session is None:
+        session = get_session()
+    
+    # One queue item per request: TRACKING_DOCS_PER_REQUEST LR numbers share a POST
+    queue = asyncio.Queue()
+    for i in range(0, len(lr_numbers), TRACKING_DOCS_PER_REQUEST):
+        queue.put_nowait(lr_numbers[i:i + TRACKING_DOCS_PER_REQUEST])
+    
+    async def worker():
+        # Each worker keeps one request in flight, so max_concurrent workers bound
+        # concurrency without a pending task per chunk
+        while True:
+            try:
+                chunk = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                response = await fetch_tracking_batch(session, chunk, now)
+            except Exception as e:
+                # Report unexpected failures per LR instead of losing the whole chunk
+                logger.error(f"Exception in tracking: {type(e).__name__} - {str(e)}")
+                response = {
+                    lr_num: TrackingResult(
+                        lr_number=lr_num,
+                        status="ERROR",
+                        error=f"{type(e).__name__}: {str(e)}"
+                    )
+                    for lr_num in chunk
+                }
+            
+            # Pass results on as each request finishes rather than collecting them all first
+            for lr_num, result in response.items():
+                if lr_num:
+                    # Errors are never cached so the next run retries them
+                    if result.status != "ERROR":
+                        _RESULT_CACHE[lr_num] = result
+                    await writer(lr_num, result)
+    
+    await asyncio.gather(*(worker() for _ in range(min(max_concurrent, queue.qsize()))))
 
 
-async def track_multiple_lr_numbers(lr_numbers: list, max_concurrent: int = 10) -> Dict[str, Dict]:
+async def track_multiple_lr_numbers(
+    lr_numbers: list,
+    max_concurrent: int = 10,
+    session: Optional[aiohttp.ClientSession] = None,
+    force_refresh: bool = False
+) -> Dict[str, TrackingResult]:
     """
-    Track multiple LR numbers in parallel
+    Track multiple LR numbers in parallel, serving recently tracked LRs from cache
     
     Args:
         lr_numbers: List of LR numbers to track
         max_concurrent: Maximum concurrent API calls
+        session: Session to use; defaults to the shared pooled session
+        force_refresh: Ignore cached statuses and query the API for every LR
         
     Returns:
         Dictionary mapping LR numbers to their status
     """
     results = {}
     
-    # Create semaphore for rate limiting
-    semaphore = asyncio.Semaphore(max_concurrent)
-    
-    async def fetch_with_semaphore(session, lr_num):
-        async with semaphore:
-            return await fetch_tracking_status(session, lr_num)
-    
-    # Create aiohttp session
-    async with aiohttp.ClientSession() as session:
-        # Create tasks for all LR numbers
-        tasks = [fetch_with_semaphore(session, lr_num) for lr_num in lr_numbers]
-        
-        # Execute all tasks concurrently
-        responses = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        # Build results dictionary
-        for response in responses:
-            if isinstance(response, Exception):
-                logger.error(f"Exception in tracking: {response}")
-                continue
-            
-            lr_num = response.get("lr_number")
-            if lr_num:
-                results[lr_num] = response
+    async def collect(lr_num: str, result: TrackingResult) -> None:
+        results[lr_num] = result
     
+    await track_multiple_lr_numbers_stream(
+        lr_numbers, collect, max_concurrent, session, force_refresh
+    )
     return results